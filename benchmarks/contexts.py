@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Time the pagination of a large index, and measure the memory held by the
+template contexts queued for the rendering workers.
+
+Run it with ``python -m benchmarks.contexts``.
+"""
+from __future__ import unicode_literals, print_function
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # NOQA
+
+from jinja2 import Environment, DictLoader
+
+from benchmarks.support import measure, report
+from pelican.contents import URLWrapper
+from pelican.generators import Generator
+from pelican.settings import _DEFAULT_CONFIG
+from pelican.writers import Writer
+
+ARTICLES = 5000
+
+
+def get_generator():
+    settings = _DEFAULT_CONFIG.copy()
+    settings['DEFAULT_PAGINATION'] = 10
+    settings['INDEX_SAVE_AS'] = 'index.html'
+    # the shared context holds the settings and the lists of the generators
+    context = settings.copy()
+    context['articles'] = context['dates'] = list(range(ARTICLES))
+    context['filenames'] = dict(('%d.rst' % i, i) for i in range(ARTICLES))
+    env = Environment(loader=DictLoader({'index.html': ''}))
+    writer = Writer('output', settings=settings)
+    writer.defer()  # keep the jobs instead of rendering them
+    return Generator(context, settings, '', '', 'output', [], writer,
+                     env=env)
+
+
+def paginate(generator):
+    articles = generator.context['articles']
+    generator.writer._deferred = []
+    generator.write_file('index.html', generator.env.get_template('index.html'),
+        generator.context, paginated={'articles': articles, 'dates': articles},
+        urlwrapper=URLWrapper('index', generator.settings, 'INDEX'),
+        page_name='index')
+
+
+def main():
+    generator = get_generator()
+    report('write_file, %d pages' % (ARTICLES // 10),
+           measure(lambda: paginate(generator)))
+
+    if tracemalloc is not None:
+        generator.writer._deferred = None
+        tracemalloc.start()
+        paginate(generator)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('%-60s %10.1f kB' % ('memory held by the queued contexts',
+                                   current / 1024.))
+
+
+if __name__ == '__main__':
+    main()
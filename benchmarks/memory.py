@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Measure the memory used by the content objects of a large site and by
+their tags, categories and authors.
+
+Run it with ``python -m benchmarks.memory``. It needs the tracemalloc module,
+available since Python 3.4.
+"""
+from __future__ import unicode_literals, print_function
+
+import random
+import datetime
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  # NOQA
+
+from benchmarks.support import measure, report
+from pelican.contents import Article, Author, Category, Tag
+from pelican.settings import _DEFAULT_CONFIG
+
+ARTICLES = 5000
+
+
+def metadata(settings, count=ARTICLES):
+    """Return the metadata of ``count`` articles, as returned by the
+    readers."""
+    _random = random.Random(0)
+    result = []
+    for i in range(count):
+        result.append({
+            'title': 'Article number %d' % i,
+            'date': datetime.datetime(2010, 1, 1) + datetime.timedelta(
+                hours=_random.randint(0, 30000)),
+            'category': [Category('category %d' % (i % 20), settings)],
+            'tags': [Tag('tag %d' % _random.randint(0, 200), settings)
+                     for _ in range(3)],
+            'author': Author('author %d' % (i % 5), settings),
+            'summary': 'The summary of the article %d' % i,
+        })
+    return result
+
+
+def allocated(func):
+    """Return the size, in bytes, of the memory allocated by ``func`` and
+    still held once it returns, with the value returned by ``func``."""
+    tracemalloc.start()
+    try:
+        value = func()
+        return tracemalloc.get_traced_memory()[0], value
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    if tracemalloc is None:
+        print('tracemalloc is needed to measure the memory')
+        return
+
+    settings = _DEFAULT_CONFIG.copy()
+    inputs = metadata(settings)
+    size, articles = allocated(lambda: [
+        Article('<p>content</p>', m, settings=settings,
+                filename='article%d.rst' % i)
+        for i, m in enumerate(inputs)])
+    print('%-60s %10.0f B' % ('memory per article', size / len(articles)))
+
+    names = ['tag %d' % i for i in range(ARTICLES)]
+    size, tags = allocated(lambda: [Tag(name, settings) for name in names])
+    print('%-60s %10.0f B' % ('memory per tag', size / len(tags)))
+
+    report('Article()', measure(lambda: Article(
+        '<p>content</p>', inputs[0], settings=settings,
+        filename='article.rst')))
+    article = articles[0]
+    report('article attributes', measure(
+        lambda: (article.title, article.date, article.slug, article.tags,
+                 article.status, article.url)))
+
+
+if __name__ == '__main__':
+    main()
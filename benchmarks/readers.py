@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Time the reading of each content file of the tests and the samples.
+
+Run it with ``python -m benchmarks.readers``.
+"""
+from __future__ import unicode_literals, print_function
+
+import os
+
+from benchmarks.support import (measure, report, ROOT_DIR,
+                                TESTS_CONTENT_PATH, SAMPLES_CONTENT_PATH)
+from pelican import readers
+from pelican.settings import _DEFAULT_CONFIG
+
+
+def content_files():
+    for path in (TESTS_CONTENT_PATH, SAMPLES_CONTENT_PATH):
+        for root, dirs, files in os.walk(path):
+            for f in sorted(files):
+                ext = os.path.splitext(f)[1][1:]
+                reader = readers._EXTENSIONS.get(ext)
+                if reader is not None and reader.enabled:
+                    yield os.path.join(root, f)
+
+
+def main():
+    settings = _DEFAULT_CONFIG.copy()
+    total = 0
+    for filename in content_files():
+        name = os.path.relpath(filename, ROOT_DIR)
+        read = lambda: readers.read_file(filename, settings=settings)
+        try:
+            read()
+        except Exception as e:
+            print('%-60s %13s' % (name, 'failed'), e)
+            continue
+        seconds = measure(read)
+        report(name, seconds)
+        total += seconds
+    report('total', total)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Run the benchmarks, and compare their results with a baseline.
+
+Run all of them, or only some of them, with::
+
+    python -m benchmarks.run
+    python -m benchmarks.run utils summaries
+
+Save the results of a run with ``--save baseline.json``, then compare the
+results of another run with them with ``--compare baseline.json``. The
+benchmarks slower than the baseline by more than ``--threshold`` percent are
+flagged, and the exit status is 1 if there are any.
+"""
+from __future__ import unicode_literals, print_function
+
+import sys
+import json
+import argparse
+
+from benchmarks import support
+
+BENCHMARKS = ('readers', 'summaries', 'contexts', 'utils', 'memory')
+
+
+def run(names):
+    """Run the given benchmarks and return a dict of their results, keyed by
+    ``'<benchmark>: <name>'``."""
+    results = {}
+    for name in names:
+        print('== %s' % name)
+        module = __import__('benchmarks.%s' % name, fromlist=['main'])
+        del support.RESULTS[:]
+        module.main()
+        for result_name, seconds in support.RESULTS:
+            results['%s: %s' % (name, result_name)] = seconds
+        print()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the changes from the baseline, and return the names of the
+    benchmarks slower by more than ``threshold`` percent."""
+    regressions = []
+    print('%-60s %10s %10s %8s' % ('', 'baseline', 'current', 'change'))
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old, new = baseline[name], results[name]
+        change = (new - old) * 100 / old if old else 0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = ' slower'
+        print('%-60s %7.3f ms %7.3f ms %+7.1f%%%s' % (
+            name[:60], old * 1000, new * 1000, change, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run the benchmarks of Pelican.')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+        help='The benchmarks to run, among %s. All of them by default.'
+             % ', '.join(BENCHMARKS))
+    parser.add_argument('--save', metavar='FILE',
+        help='Save the results to this file.')
+    parser.add_argument('--compare', metavar='FILE',
+        help='Compare the results with the ones saved in this file.')
+    parser.add_argument('--threshold', type=float, default=10,
+        help='Percentage of slowdown over which a benchmark is flagged.')
+    args = parser.parse_args(argv)
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark %s' % name)
+    results = run(args.benchmarks or BENCHMARKS)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print('Results saved to %s' % args.save)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('%d benchmark(s) slower than the baseline by more than '
+                  '%g%%' % (len(regressions), args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Time the truncation of long articles into summaries.
+
+Run it with ``python -m benchmarks.summaries``.
+"""
+from __future__ import unicode_literals, print_function
+
+from jinja2.utils import generate_lorem_ipsum
+
+from benchmarks.support import measure, report
+from pelican.contents import Article
+from pelican.settings import _DEFAULT_CONFIG
+from pelican.utils import truncate_html_words
+
+
+def long_content(paragraphs=200):
+    """Return an HTML content with some markup in each paragraph."""
+    return '\n'.join(
+        '<p>%s <a href="|filename|/other.rst">link</a> <em>%d</em>'
+        '<br/></p>' % (generate_lorem_ipsum(n=1, html=False), i)
+        for i in range(paragraphs))
+
+
+def main():
+    content = long_content()
+    report('truncate_html_words, 50 words', measure(
+        lambda: truncate_html_words(content, 50)))
+    report('truncate_html_words, whole content', measure(
+        lambda: truncate_html_words(content, 100000)))
+
+    settings = _DEFAULT_CONFIG.copy()
+    settings['PATH'] = '.'
+    other = Article('', {'title': 'other'}, settings=settings)
+    article = Article(content, {'title': 'title', 'category': 'misc'},
+                      settings=settings, filename='article.rst',
+                      context={'localsiteurl': '',
+                               'filenames': {'other.rst': other}})
+    report('Article.summary', measure(lambda: article.summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import os
+import sys
+import timeit
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+TESTS_CONTENT_PATH = os.path.join(ROOT_DIR, 'tests', 'content')
+SAMPLES_CONTENT_PATH = os.path.join(ROOT_DIR, 'samples', 'content')
+
+# run the benchmarks against this source tree rather than an installed pelican
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def measure(func, repeat=5, min_time=.2):
+    """Return the best time, in seconds, of one call to ``func``.
+
+    ``func`` is called in loops lasting at least ``min_time`` seconds, and the
+    best of ``repeat`` loops is kept.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+# the (name, seconds) results reported by the benchmarks, collected by
+# benchmarks.run to save or compare them
+RESULTS = []
+
+
+def report(name, seconds):
+    """Print the time of one call of a benchmark, and the number of calls per
+    second."""
+    RESULTS.append((name, seconds))
+    print('%-60s %10.3f ms %12.0f ops/s' % (name, seconds * 1000,
+                                             1 / seconds if seconds else 0))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Time the helpers called for each article: slugify, get_date, strftime,
+truncate_html_words, process_translations and the replacement of the
+intra-site links of the content.
+
+Run it with ``python -m benchmarks.utils``.
+"""
+from __future__ import unicode_literals, print_function
+
+import random
+import datetime
+
+from jinja2.utils import generate_lorem_ipsum
+
+from benchmarks.support import measure, report
+from pelican.contents import Article
+from pelican.settings import _DEFAULT_CONFIG
+from pelican.utils import (slugify, get_date, strftime, truncate_html_words,
+                           process_translations)
+
+try:
+    from pelican.utils import _slugify
+except ImportError:  # older versions, without the cache
+    _slugify = slugify  # NOQA
+
+# the inputs are random, but the same from one run to another
+_random = random.Random(0)
+
+
+def titles(count=100):
+    """Return titles in English, in French and with some markup."""
+    words = generate_lorem_ipsum(n=1, html=False, min=100, max=101).split()
+    accented = ['élève', 'garçon', 'Noël', 'œuvre', 'à', 'déjà', 'où']
+    result = []
+    for i in range(count):
+        title = ' '.join(_random.choice(words) for _ in range(6))
+        if i % 3 == 1:
+            title += ' ' + ' '.join(_random.sample(accented, 3))
+        elif i % 3 == 2:
+            title = '<em>%s</em> &amp; <code>co</code>' % title
+        result.append(title)
+    return result
+
+
+def articles(count=1000, translated=.2):
+    settings = _DEFAULT_CONFIG.copy()
+    result = []
+    for i in range(count):
+        metadata = {'title': 'article %d' % i, 'category': 'misc'}
+        result.append(Article('', metadata, settings=settings))
+        if _random.random() < translated:
+            metadata = dict(metadata, lang='fr')
+            result.append(Article('', metadata, settings=settings))
+    _random.shuffle(result)
+    return result
+
+
+def linked_content(paragraphs=20):
+    """Return an HTML content with an intra-site link in each paragraph."""
+    return '\n'.join(
+        '<p>%s <a href="|filename|/article%d.rst">link</a> '
+        '<img src="|filename|/images/%d.png"/></p>' % (
+            generate_lorem_ipsum(n=1, html=False), i, i)
+        for i in range(paragraphs))
+
+
+def per_item(func, items):
+    """Return the time of a call to ``func`` for one of the ``items``."""
+    return measure(lambda: [func(item) for item in items]) / len(items)
+
+
+def main():
+    inputs = titles()
+    report('slugify', per_item(slugify, inputs))
+    report('slugify, not cached', per_item(_slugify, inputs))
+
+    mixed = []
+    for date_format in ('%Y-%m-%d %H:%M', '%Y-%m-%d', '%d.%m.%Y %H:%M',
+                        '%Y-%m-%d %H:%M:%S', '%d/%m/%Y'):
+        dates = [(datetime.datetime(2012, 1, 1) + datetime.timedelta(
+            hours=_random.randint(0, 10000))).strftime(date_format)
+            for _ in range(100)]
+        report('get_date, %s' % date_format, per_item(get_date, dates))
+        mixed += dates[:20]
+    _random.shuffle(mixed)
+    report('get_date, mixed formats', per_item(get_date, mixed))
+
+    date = datetime.datetime(2012, 11, 30, 15, 30)
+    report('strftime, %a, %d %B %Y', measure(
+        lambda: strftime(date, '%a, %d %B %Y')))
+    report('strftime, non-ASCII format', measure(
+        lambda: strftime(date, '%d %B %Y à %Hh%M')))
+
+    content = generate_lorem_ipsum(n=20)
+    report('truncate_html_words, 50 words', measure(
+        lambda: truncate_html_words(content, 50)))
+
+    inputs = articles()
+    report('process_translations, %d contents' % len(inputs), measure(
+        lambda: process_translations(list(inputs))))
+
+    content = linked_content()
+    settings = _DEFAULT_CONFIG.copy()
+    settings['PATH'] = '.'
+    filenames = {}
+    for i in range(20):
+        filenames['article%d.rst' % i] = Article(
+            '', {'title': 'article %d' % i}, settings=settings)
+        filenames['images/%d.png' % i] = filenames['article%d.rst' % i]
+    article = Article(content, {'title': 'title', 'category': 'misc'},
+                      settings=settings, filename='article.rst',
+                      context={'localsiteurl': '', 'filenames': filenames})
+
+    def parse():
+        article._link_chunks = None
+        return article._update_content(content, '..')
+    report('Page._update_content, %d links' % (2 * 20), measure(parse))
+    report('Page._update_content, parsed links', measure(
+        lambda: article._update_content(content, '..')))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,15 +9,19 @@ import time
 import logging
 import argparse
 
-from pelican import signals
-
-from pelican.generators import (ArticlesGenerator, PagesGenerator,
-                                StaticGenerator, PdfGenerator,
-                                SourceFileGenerator, TemplatePagesGenerator)
+from pelican import signals, profiler
+from pelican.cache import DependencyGraph
+from pelican.contents import Page, clear_url_wrappers
+
+from pelican.generators import (Generator, ArticlesGenerator,
+                                PagesGenerator, StaticGenerator, PdfGenerator,
+                                SourceFileGenerator, TemplatePagesGenerator,
+                                create_environment)
 from pelican.log import init
 from pelican.settings import read_settings
-from pelican.utils import (clean_output_dir, files_changed, file_changed,
+from pelican.utils import (clean_output_dir, file_changed, has_files,
                            NoFilesError)
+from pelican.watcher import Watcher
 from pelican.writers import Writer
 
 __major__ = 3
@@ -28,6 +32,13 @@ __version__ = "{0}.{1}.{2}".format(__major__, __minor__, __micro__)
 
 logger = logging.getLogger(__name__)
 
+# The generators which only have to run when a content file or a template
+# changed
+CONTENT_GENERATORS = (ArticlesGenerator, PagesGenerator,
+                      TemplatePagesGenerator, SourceFileGenerator)
+# The generators which do not need the content when only static files changed
+STATIC_GENERATORS = (StaticGenerator, PdfGenerator)
+
 
 class Pelican(object):
     def __init__(self, settings):
@@ -135,27 +146,60 @@ class Pelican(object):
             self.settings['TRANSLATION_FEED_ATOM'] =\
                     self.settings['TRANSLATION_FEED']
 
-    def run(self):
-        """Run the generators and return"""
+    def run(self, changed_paths=None):
+        """Run the generators and return
 
+        :param changed_paths: the paths changed since the previous run, if
+            known. When all of them are static files, only the static files
+            are copied, unless generators of plugins are registered: they
+            may need the content, so the whole site is generated.
+        """
+        generator_classes = self.get_generator_classes()
+        static_only = changed_paths is not None and \
+                self.only_static_changed(changed_paths) and \
+                all(cls in CONTENT_GENERATORS + STATIC_GENERATORS
+                    for cls in generator_classes)
+        if static_only:
+            logger.info('Only static files changed, copying them')
+            generator_classes = [cls for cls in generator_classes
+                                 if cls in STATIC_GENERATORS]
+
+        clear_url_wrappers(self.settings)
         context = self.settings.copy()
         context['filenames'] = {}  # share the dict between all the generators
         context['localsiteurl'] = self.settings.get('SITEURL')  # share
-        generators = [
-            cls(
+        writer = self.get_writer()
+        env = self.get_environment()
+        if self.settings.get('INCREMENTAL_BUILD') and not static_only:
+            writer.dependencies = DependencyGraph(os.path.join(
+                self.settings['CACHE_PATH'], 'dependencies.json'),
+                self.settings)
+        generators = []
+        for cls in generator_classes:
+            # the generators of plugins do not necessarily derive from
+            # Generator, nor accept the shared environment
+            kwargs = {}
+            if issubclass(cls, Generator):
+                kwargs['env'] = env
+            generators.append(cls(
                 context,
                 self.settings,
                 self.path,
                 self.theme,
                 self.output_path,
                 self.markup,
-                self.get_writer()
-            ) for cls in self.get_generator_classes()
-        ]
+                writer,
+                **kwargs
+            ))
 
         for p in generators:
             if hasattr(p, 'generate_context'):
-                p.generate_context()
+                with profiler.measure(profiler.PHASE, '%s.generate_context'
+                                      % p.__class__.__name__):
+                    p.generate_context()
+
+        with profiler.measure(profiler.PHASE, 'resolve_links'):
+            self.resolve_links(context)
 
         # erase the directory if it is not the source and if that's
         # explicitely asked
@@ -163,13 +207,58 @@ class Pelican(object):
                 os.path.realpath(self.path).startswith(self.output_path)):
             clean_output_dir(self.output_path)
 
-        writer = self.get_writer()
+        # render the templates in parallel once all of them are known
+        write_workers = self.settings.get('WRITE_WORKERS', 1)
+        if write_workers > 1:
+            writer.defer()
 
         for p in generators:
             if hasattr(p, 'generate_output'):
-                p.generate_output(writer)
-
-        signals.finalized.send(self)
+                with profiler.measure(profiler.PHASE, '%s.generate_output'
+                                      % p.__class__.__name__):
+                    p.generate_output(writer)
+
+        with profiler.measure(profiler.PHASE, 'flush'):
+            writer.flush(write_workers)
+        logger.info('%d files written, %d unchanged' % (writer.written,
+                                                        writer.unchanged))
+        if writer.dependencies is not None:
+            writer.dependencies.save()
+
+        with profiler.measure(profiler.PHASE, 'finalized'):
+            signals.finalized.send(self)
+
+    def resolve_links(self, context):
+        """Resolve the intra-site links of all the content objects, now that
+        they are all known, and report the ones which cannot be resolved."""
+        unresolved = []
+        for name, content in sorted(context['filenames'].items()):
+            if isinstance(content, Page):
+                for link in sorted(content.resolve_links()):
+                    unresolved.append('%s (in %s)' % (link, name))
+        if unresolved:
+            logger.warning('Unable to find %d linked file(s), skipping url '
+                           'replacement:\n    %s' % (len(unresolved),
+                           '\n    '.join(unresolved)))
+
+    def only_static_changed(self, changed_paths):
+        """Return True if none of the changed paths is a content file or a
+        template, in which case copying the static files is enough."""
+        if self.delete_outputdir:
+            return False
+        template_paths = [os.path.join(self.theme, 'templates')]
+        template_paths += self.settings.get('EXTRA_TEMPLATES_PATHS', [])
+        template_paths = [os.path.abspath(os.path.expanduser(path)) + os.sep
+                          for path in template_paths]
+        template_pages = set(os.path.abspath(os.path.join(self.path, source))
+                             for source in self.settings['TEMPLATE_PAGES'])
+        for path in changed_paths:
+            path = os.path.abspath(path)
+            if any(path.endswith('.' + ext) for ext in self.markup) or \
+                    any(path.startswith(p) for p in template_paths) or \
+                    path in template_pages:
+                return False
+        return True
 
     def get_generator_classes(self):
         generators = [StaticGenerator, ArticlesGenerator, PagesGenerator]
@@ -197,6 +286,9 @@ class Pelican(object):
     def get_writer(self):
         return Writer(self.output_path, settings=self.settings)
 
+    def get_environment(self):
+        return create_environment(self.settings, self.theme)
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="""A tool to generate a
@@ -241,6 +333,23 @@ def parse_arguments():
     parser.add_argument('--version', action='version', version=__version__,
         help='Print the pelican version and exit.')
 
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int,
+        help='Number of processes to use to read the content files and '
+             'to render the templates.')
+
+    parser.add_argument('--profile', dest='profile', action='store_true',
+        help='Print the time spent in each phase of the build, and the '
+             'slowest files to read, render and write.')
+
+    parser.add_argument('--profile-top', dest='profile_top', type=int,
+        default=10, help='Number of files listed by --profile for each '
+                         'operation.')
+
+    parser.add_argument('--profile-output', dest='profile_output',
+        help='Write the timings recorded by --profile to this file, as JSON '
+             'if its name ends with .json, or as cProfile statistics '
+             'otherwise.')
+
     parser.add_argument('-r', '--autoreload', dest='autoreload',
         action='store_true',
         help="Relaunch pelican each time a modification occurs"
@@ -262,6 +371,9 @@ def get_config(args):
         config['THEME'] = abstheme if os.path.exists(abstheme) else args.theme
     if args.delete_outputdir is not None:
         config['DELETE_OUTPUT_DIRECTORY'] = args.delete_outputdir
+    if args.jobs:
+        config['READ_WORKERS'] = args.jobs
+        config['WRITE_WORKERS'] = args.jobs
     return config
 
 
@@ -278,6 +390,13 @@ def get_instance(args):
     return cls(settings)
 
 
+def get_watcher(pelican):
+    """Return a watcher of the source files and the theme of ``pelican``."""
+    return Watcher([pelican.path, pelican.theme],
+                   ignore=[pelican.output_path,
+                           pelican.settings['CACHE_PATH']])
+
+
 def main():
     args = parse_arguments()
     init(args.verbosity)
@@ -285,42 +404,58 @@ def main():
 
     try:
         if args.autoreload:
+            watcher = get_watcher(pelican)
+            changed_paths = None  # generate the whole site first
             files_found_error = True
             while True:
                 try:
-                    # Check source dir for changed files ending with the given
-                    # extension in the settings. In the theme dir is no such
-                    # restriction; all files are recursively checked if they
-                    # have changed, no matter what extension the filenames
-                    # have.
-                    if files_changed(pelican.path, pelican.markup) or \
-                            files_changed(pelican.theme, ['']):
-                        if not files_found_error:
-                            files_found_error = True
+                    if (changed_paths is None or changed_paths) and \
+                            not has_files(pelican.path, pelican.markup):
+                        raise NoFilesError('No files with the given '
+                                           'extension(s) found.')
+                    files_found_error = True
+
+                    # All the files of the source dir and of the theme are
+                    # watched, and only the work affected by the changed
+                    # files is done again.
+                    if changed_paths is None:
                         pelican.run()
+                    elif changed_paths:
+                        logger.info('%d file(s) changed, re-generating' %
+                                    len(changed_paths))
+                        pelican.run(changed_paths=changed_paths)
 
                     # reload also if settings.py changed
                     if file_changed(args.settings):
                         logger.info('%s changed, re-generating' %
                                     args.settings)
                         pelican = get_instance(args)
+                        watcher.close()
+                        watcher = get_watcher(pelican)
                         pelican.run()
 
-                    time.sleep(.5)  # sleep to avoid cpu load
+                    changed_paths = watcher.wait(timeout=.5)
                 except KeyboardInterrupt:
                     logger.warning("Keyboard interrupt, quitting.")
+                    watcher.close()
                     break
                 except NoFilesError:
                     if files_found_error:
                         logger.warning("No valid files found in content. "
                                        "Nothing to generate.")
                         files_found_error = False
+                    # generate the whole site once files are added
+                    changed_paths = None
                     time.sleep(1)  # sleep to avoid cpu load
                 except Exception as e:
                     logger.warning(
                         "Caught exception \"{}\". Reloading.".format(e)
                     )
+                    changed_paths = set()
                     continue
+        elif args.profile or args.profile_output:
+            profiler.profile(pelican.run, args.profile_top,
+                             args.profile_output)
         else:
             pelican.run()
     except Exception as e:
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import os
+import re
+import json
+import errno
+import hashlib
+import logging
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle  # NOQA
+
+from pelican.contents import Page, URLWrapper
+
+logger = logging.getLogger(__name__)
+
+# bump this when the format of the cached values changes
+CACHE_VERSION = 2
+
+# settings which change what a reader returns for a given source file
+_READER_SETTINGS = ('TYPOGRIFY', 'FILENAME_METADATA', 'ASCIIDOC_OPTIONS')
+
+# libraries whose version changes what a reader returns
+_READER_LIBRARIES = ('docutils', 'markdown', 'pygments', 'typogrify',
+                     'asciidocapi')
+_library_versions = None
+
+
+def settings_fingerprint(settings):
+    """Return a hash of the settings affecting the output of the readers."""
+    settings = settings or {}
+    keys = sorted(k for k in settings
+                  if k.endswith('_EXTENSIONS') or k in _READER_SETTINGS)
+    fingerprint = hashlib.sha1()
+    for key in keys:
+        fingerprint.update(('%s=%r;' % (key, settings[key])).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+def library_versions():
+    """Return the versions of Pelican and of the libraries used by the
+    readers, as a string."""
+    global _library_versions
+    if _library_versions is None:
+        import pelican
+        versions = ['pelican=%s' % pelican.__version__]
+        for name in _READER_LIBRARIES:
+            try:
+                module = __import__(name)
+            except ImportError:
+                continue
+            version = getattr(module, '__version__',
+                              getattr(module, 'version', ''))
+            versions.append('%s=%s' % (name, version))
+        _library_versions = ';'.join(versions)
+    return _library_versions
+
+
+def file_digest(filename):
+    """Return a hash of the content of a file, or None if it cannot be
+    read."""
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+class ReaderCache(object):
+    """On-disk cache of the ``(content, metadata)`` couples returned by the
+    readers.
+
+    Each entry is stored in its own pickle file, named after a hash of the
+    source file content, the reader class, the reader settings and the
+    versions of Pelican and of the libraries used by the readers. The other
+    files the source depends on, e.g. the files included by a
+    reStructuredText document, are stored with a hash of their content, and
+    the entry is ignored when one of them changed. When the total size of
+    the entries exceeds ``max_size`` bytes, the least recently used ones are
+    evicted.
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        self._size = None
+
+    def get_key(self, filename, reader, settings):
+        """Return the key of the cache entry for the given source file."""
+        key = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            key.update(f.read())
+        # FILENAME_METADATA extracts metadata from the name of the file
+        key.update(os.path.basename(filename).encode('utf-8'))
+        key.update(('%s.%s:%s:%s:%s' % (reader.__class__.__module__,
+            reader.__class__.__name__, settings_fingerprint(settings),
+            library_versions(), CACHE_VERSION)).encode('utf-8'))
+        return key.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None."""
+        entry = self._entry(key)
+        try:
+            with open(entry, 'rb') as f:
+                value, dependencies = pickle.load(f)
+        except (IOError, OSError):
+            return None
+        except Exception as e:
+            logger.debug('Ignoring corrupted cache entry %s: %s' % (entry, e))
+            return None
+        for filename, digest in dependencies:
+            if file_digest(filename) != digest:
+                logger.debug('Ignoring cache entry %s: %s changed' % (
+                    entry, filename))
+                return None
+        try:
+            # mark the entry as recently used
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, dependencies=()):
+        """Store ``value`` for ``key``, evicting old entries if needed.
+
+        :param dependencies: the other files ``value`` has been read from
+        """
+        dependencies = [(filename, file_digest(filename))
+                        for filename in dependencies]
+        try:
+            data = pickle.dumps((value, dependencies),
+                                pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug('Unable to cache %s: %s' % (key, e))
+            return
+        try:
+            os.makedirs(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # write to a temporary file first so that concurrent builds never
+        # read a partially written entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.tmp')
+        entry = self._entry(key)
+        try:
+            replaced = os.path.getsize(entry)
+        except OSError:
+            replaced = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmp, entry)
+        except OSError as e:
+            logger.debug('Unable to cache %s: %s' % (key, e))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+
+        if self.max_size:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data) - replaced
+            if self._size > self.max_size:
+                self.evict()
+
+    def _entries(self):
+        """Yield ``(path, size, mtime)`` for each entry of the cache."""
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Remove the least recently used entries until the cache uses at
+        most 90% of ``max_size``."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        target = self.max_size * 0.9
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            logger.debug('Evicted %s from the reader cache' % path)
+        self._size = size
+
+
+_READER_CACHES = {}
+
+
+def get_reader_cache(settings):
+    """Return the reader cache to use with the given settings, or None if
+    content caching is disabled."""
+    if not settings or not settings.get('CACHE_CONTENT'):
+        return None
+    path = os.path.join(settings.get('CACHE_PATH', 'cache'), 'content')
+    if path not in _READER_CACHES:
+        _READER_CACHES[path] = ReaderCache(path)
+    cache = _READER_CACHES[path]
+    cache.max_size = settings.get('CACHE_CONTENT_MAX_SIZE')
+    return cache
+
+
+_ADDRESS_RE = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+def _stable_repr(value):
+    """Return a representation of ``value`` which does not change from one
+    build to another."""
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ','.join(_stable_repr(item) for item in value)
+    if isinstance(value, URLWrapper):
+        return value.name
+    return _ADDRESS_RE.sub('', repr(value))
+
+
+class DependencyGraph(object):
+    """Record the inputs each output file has been generated from.
+
+    The inputs of an output are the site as a whole (the settings, the
+    templates and the list of all the content objects with their metadata)
+    and the content objects passed to the template to render this output.
+    Their fingerprints are combined into a signature stored in a JSON file.
+    On the next build, the outputs whose signature did not change are not
+    generated again.
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        try:
+            with open(path) as f:
+                self.previous = json.load(f)['outputs']
+        except (IOError, OSError, ValueError, KeyError):
+            self.previous = {}
+        self.current = {}
+        self.up_to_date = 0
+        self._fingerprints = {}
+        self._site_signature = None
+
+    def fingerprint(self, filename):
+        """Return the fingerprint of a source file."""
+        if filename not in self._fingerprints:
+            try:
+                stat = os.stat(filename)
+                self._fingerprints[filename] = '%r:%r' % (stat.st_mtime,
+                                                          stat.st_size)
+            except OSError:
+                self._fingerprints[filename] = 'missing'
+        return self._fingerprints[filename]
+
+    def _template_files(self):
+        theme_path = os.path.dirname(os.path.abspath(__file__))
+        paths = [os.path.join(self.settings['THEME'], 'templates'),
+                 os.path.join(theme_path, 'themes', 'simple', 'templates')]
+        paths += self.settings.get('EXTRA_TEMPLATES_PATHS', [])
+        for path in paths:
+            for root, dirs, files in os.walk(os.path.expanduser(path)):
+                for f in files:
+                    yield os.path.join(root, f)
+        for source in self.settings.get('TEMPLATE_PAGES', {}):
+            yield os.path.join(self.settings['PATH'], source)
+
+    def site_signature(self, context):
+        """Return the signature of the inputs shared by all the outputs."""
+        if self._site_signature is None:
+            signature = hashlib.sha1()
+            parts = ['%s' % CACHE_VERSION]
+            for key in sorted(self.settings):
+                parts.append('%s=%s' % (key, _stable_repr(self.settings[key])))
+            for filename in sorted(self._template_files()):
+                parts.append('%s@%s' % (filename, self.fingerprint(filename)))
+            filenames = (context or {}).get('filenames', {})
+            for key in sorted(filenames):
+                content = filenames[key]
+                # the metadata given by the reader, static files have none
+                metadata = getattr(content, 'metadata', {})
+                parts.append('%s:%s:%s' % (key, getattr(content, 'url', ''),
+                    _stable_repr(sorted((k, v) for k, v in metadata.items()
+                                        if k != 'summary'))))
+            for part in parts:
+                signature.update(part.encode('utf-8'))
+            self._site_signature = signature.hexdigest()
+        return self._site_signature
+
+    def _describe(self, value):
+        """Return the description of a value a template depends on."""
+        if isinstance(value, Page):
+            # translations are listed as well, but not described any further
+            # since they refer to each other
+            description = []
+            for content in [value] + list(value.translations):
+                filename = getattr(content, 'filename', None)
+                if filename is None:
+                    description.append(_stable_repr(
+                        sorted(content.metadata.items())))
+                    continue
+                description.append('%s@%s' % (filename,
+                                               self.fingerprint(filename)))
+            return ';'.join(description)
+        if hasattr(value, 'object_list'):  # paginators and pages
+            return '%s:%s' % (getattr(value, 'number', ''),
+                              self._describe(value.object_list))
+        if isinstance(value, (list, tuple)):
+            return '[%s]' % ','.join(self._describe(item) for item in value)
+        return _stable_repr(value)
+
+    def _signature(self, context, *parts):
+        signature = hashlib.sha1()
+        signature.update(self.site_signature(context).encode('utf-8'))
+        for part in parts:
+            signature.update(part.encode('utf-8'))
+        return signature.hexdigest()
+
+    def file_signature(self, name, template, localcontext, context, siteurl):
+        """Return the signature of a rendered template.
+
+        Only the values of ``localcontext`` which are not shared with the
+        site ``context`` are taken into account, the others are part of the
+        site signature.
+        """
+        parts = [name, template.name or '', '%s' % siteurl]
+        for key in sorted(localcontext):
+            if key in ('output_file', 'localsiteurl'):
+                continue
+            value = localcontext[key]
+            if context is not None and context.get(key) is value:
+                continue
+            parts.append('%s=%s' % (key, self._describe(value)))
+        return self._signature(context, *parts)
+
+    def feed_signature(self, filename, feed_type, elements, context):
+        """Return the signature of a feed."""
+        parts = [filename, feed_type, self._describe(elements)]
+        return self._signature(context, *parts)
+
+    def update(self, output, signature):
+        """Record the signature of ``output`` and return whether it has to
+        be generated again."""
+        self.current[output] = {'signature': signature}
+        previous = self.previous.get(output)
+        if previous is not None and previous['signature'] == signature:
+            self.up_to_date += 1
+            return False
+        return True
+
+    def save(self):
+        """Write the dependencies of this build on the disk."""
+        logger.info('%d out of %d outputs were up to date' % (
+            self.up_to_date, len(self.current)))
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'outputs': self.current}, f)
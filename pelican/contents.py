@@ -3,7 +3,6 @@ from __future__ import unicode_literals, print_function
 import six
 
 import copy
-import locale
 import logging
 import functools
 import os
@@ -15,12 +14,23 @@ from sys import platform, stdin
 
 from pelican.settings import _DEFAULT_CONFIG
 from pelican.utils import (slugify, truncate_html_words, memoized,
-    python_2_unicode_compatible)
+    python_2_unicode_compatible, get_date_formatter)
 from pelican import signals
 import pelican.utils
 
 logger = logging.getLogger(__name__)
 
+_LINK_RE = re.compile(r"""
+    (?P<markup><\s*[^\>]*  # match tag with src and href attr
+        (?:href|src)\s*=)
+
+    (?P<quote>["\'])      # require value to be quoted
+    (?P<path>\|(?P<what>.*?)\|(?P<value>.*?))  # the url value
+    \2""", re.X)
+
+
+# the unresolved links of the content objects which have none
+_NO_LINKS = frozenset()
 
 class Page(object):
     """Represents a page
@@ -31,6 +41,14 @@ class Page(object):
     mandatory_properties = ('title',)
     default_template = 'page'
 
+    # the attributes set by Pelican are stored in slots, the other metadata
+    # (and the attributes set by plugins) in __dict__
+    __slots__ = ('settings', '_content', '_context', 'translations',
+                 '_link_chunks', '_summaries', 'unresolved_links', 'metadata',
+                 'template', 'author', 'in_default_lang', 'lang', 'slug',
+                 'filename', 'date_format', 'locale_date', 'status',
+                 '_summary', '__dict__', '__weakref__')
+
     def __init__(self, content, metadata=None, settings=None,
                  filename=None, context=None):
         # init parameters
@@ -43,6 +61,10 @@ class Page(object):
         self._content = content
         self._context = context
         self.translations = []
+        # the caches are created when they are first used
+        self._link_chunks = None
+        self._summaries = None
+        self.unresolved_links = _NO_LINKS
 
         local_metadata = dict(settings.get('DEFAULT_METADATA', ()))
         local_metadata.update(metadata)
@@ -50,7 +72,7 @@ class Page(object):
         # set metadata as attributes
         for key, value in local_metadata.items():
             setattr(self, key.lower(), value)
-        
+
         # also keep track of the metadata attributes available
         self.metadata = local_metadata
 
@@ -60,7 +82,8 @@ class Page(object):
         # default author to the one in settings if not defined
         if not hasattr(self, 'author'):
             if 'AUTHOR' in settings:
-                self.author = Author(settings['AUTHOR'], settings)
+                self.author = get_url_wrapper(Author, settings['AUTHOR'],
+                                              settings)
 
         # manage languages
         self.in_default_lang = True
@@ -86,12 +109,13 @@ class Page(object):
                 self.date_format = settings['DEFAULT_DATE_FORMAT']
 
         if isinstance(self.date_format, tuple):
-            locale.setlocale(locale.LC_ALL, self.date_format[0])
+            date_formatter = get_date_formatter(self.date_format[0])
             self.date_format = self.date_format[1]
+        else:
+            date_formatter = pelican.utils.strftime
 
         if hasattr(self, 'date'):
-            self.locale_date = pelican.utils.strftime(self.date,
-                self.date_format)
+            self.locale_date = date_formatter(self.date, self.date_format)
 
         # manage status
         if not hasattr(self, 'status'):
@@ -131,26 +155,19 @@ class Page(object):
         key = key if self.in_default_lang else 'lang_%s' % key
         return self._expand_settings(key)
 
-    def _update_content(self, content, siteurl):
-        """Change all the relative paths of the content to relative paths
-        suitable for the ouput content.
+    def _parse_links(self, content):
+        """Split the content around its intra-site links.
 
-        :param content: content resource that will be passed to the templates.
-        :param siteurl: siteurl which is locally generated by the writer in
-            case of RELATIVE_URLS.
+        Return a list of chunks of the content, where None stands for the
+        siteurl. The links which cannot be resolved are left untouched and
+        added to ``self.unresolved_links``.
         """
-        hrefs = re.compile(r"""
-            (?P<markup><\s*[^\>]*  # match tag with src and href attr
-                (?:href|src)\s*=)
-
-            (?P<quote>["\'])      # require value to be quoted
-            (?P<path>\|(?P<what>.*?)\|(?P<value>.*?))  # the url value
-            \2""", re.X)
-
-        def replacer(m):
+        chunks = []
+        last = 0
+        for m in _LINK_RE.finditer(content):
             what = m.group('what')
             value = m.group('value')
-            origin = m.group('path')
+            link = [m.group('path')]
             # we support only filename for now. the plan is to support
             # categories, tags, etc. in the future, but let's keep things
             # simple for now.
@@ -164,21 +181,56 @@ class Page(object):
                         os.path.join(self.relative_dir, value)
                     )
                 if value in self._context['filenames']:
-                    origin = '/'.join((siteurl,
-                             self._context['filenames'][value].url))
+                    url = '/' + self._context['filenames'][value].url
                     if hash:
-                        origin = "%s#%s" % (origin, hash)
+                        url = "%s#%s" % (url, hash)
+                    link = [None, url]
                 else:
-                    logger.warning("Unable to find {fn}, skipping url"
-                                    " replacement in {file}"
-                                    .format(fn=value, file=self.filename))
+                    logger.debug("Unable to find {fn}, skipping url"
+                                 " replacement in {file}"
+                                 .format(fn=value, file=self.filename))
+                    if not self.unresolved_links:
+                        self.unresolved_links = set()
+                    self.unresolved_links.add(value)
 
             if what == 'SITEURL':
-                origin = "%s%s" % (siteurl, value)
-            return m.group('markup') + m.group('quote') + origin \
-                    + m.group('quote')
+                link = [None, value]
+            chunks.append(content[last:m.start()] + m.group('markup') +
+                          m.group('quote'))
+            chunks.extend(link)
+            chunks.append(m.group('quote'))
+            last = m.end()
+        chunks.append(content[last:])
+        return chunks
+
+    def _update_content(self, content, siteurl):
+        """Change all the relative paths of the content to relative paths
+        suitable for the ouput content.
 
-        return hrefs.sub(replacer, content)
+        The links are only parsed once for a given content, the result is
+        reused for every siteurl.
+
+        :param content: content resource that will be passed to the templates.
+        :param siteurl: siteurl which is locally generated by the writer in
+            case of RELATIVE_URLS.
+        """
+        if self._link_chunks is None:
+            self._link_chunks = {}
+        chunks = self._link_chunks.get(content)
+        if chunks is None:
+            if len(self._link_chunks) >= 8:  # the content keeps changing
+                self._link_chunks.clear()
+            chunks = self._link_chunks[content] = self._parse_links(content)
+        return ''.join(siteurl if chunk is None else chunk
+                       for chunk in chunks)
+
+    def resolve_links(self):
+        """Resolve the intra-site links of the content, once all the content
+        files are known, and return the ones which cannot be resolved."""
+        self._link_chunks = None
+        self.unresolved_links = _NO_LINKS
+        self.get_content(self._context['localsiteurl'])
+        return self.unresolved_links
 
     def get_content(self, siteurl, content_type='HTML'):
         return self._update_content(
@@ -196,9 +248,21 @@ class Page(object):
         if hasattr(self, '_summary'):
             return self._summary
         else:
-            if self.settings['SUMMARY_MAX_LENGTH']:
-                return truncate_html_words(self.content,
-                        self.settings['SUMMARY_MAX_LENGTH'])
+            max_length = self.settings['SUMMARY_MAX_LENGTH']
+            if max_length:
+                # the summary is displayed in many pages, only truncate the
+                # content once
+                content = self.content
+                key = (content, max_length)
+                if self._summaries is None:
+                    self._summaries = {}
+                summary = self._summaries.get(key)
+                if summary is None:
+                    if len(self._summaries) >= 8:  # the content keeps changing
+                        self._summaries.clear()
+                    summary = self._summaries[key] = truncate_html_words(
+                            content, max_length)
+                return summary
             return self.content
 
     def _set_summary(self, summary):
@@ -242,6 +306,7 @@ class Page(object):
 class Article(Page):
     mandatory_properties = ('title', 'date', 'category')
     default_template = 'article'
+    __slots__ = ()
 
     def _get_content(self, content_type):
         modifiers = self.settings.get('%s_CONTENT_MODIFIERS' % content_type, [])
@@ -253,10 +318,17 @@ class Article(Page):
 
 class Quote(Page):
     base_properties = ('author', 'date')
+    __slots__ = ()
 
 
 @python_2_unicode_compatible
 class URLWrapper(object):
+    # there is a wrapper for each tag, category and author of each content
+    # object. The attributes set by plugins go to __dict__, which is only
+    # created when needed.
+    __slots__ = ('name', 'slug', 'settings', 'setting_var', '__dict__',
+                 '__weakref__')
+
     def __init__(self, name, settings, setting_var=None):
         self.name = name
         self.slug = slugify(self.name)
@@ -265,9 +337,25 @@ class URLWrapper(object):
             setting_var = self.__class__.__name__.upper()
         self.setting_var = setting_var
 
-
     def as_dict(self):
-        return self.__dict__
+        """Return the values available to the URL settings: the name, the slug
+        and the attributes set by plugins."""
+        values = dict(getattr(self, '__dict__', None) or ())
+        values.update(name=self.name, slug=self.slug)
+        return values
+
+    def __getstate__(self):
+        # the settings can hold unpicklable values (e.g. JINJA_FILTERS), they
+        # have to be attached back once unpickled
+        state = dict(getattr(self, '__dict__', None) or ())
+        state.update(name=self.name, slug=self.slug,
+                     setting_var=self.setting_var)
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            if key != 'settings':
+                setattr(self, key, value)
 
     def __hash__(self):
         return hash(self.name)
@@ -337,17 +425,120 @@ class URLWrapper(object):
 
 
 class Category(URLWrapper):
+    __slots__ = ()
+
     def __init__(self, name, *args, **kwargs):
         super(Category, self).__init__(name.strip(), *args, **kwargs)
 
 
 class Tag(URLWrapper):
+    __slots__ = ()
+
     def __init__(self, name, *args, **kwargs):
         super(Tag, self).__init__(name.strip(), *args, **kwargs)
 
 
 class Author(URLWrapper):
-    pass
+    __slots__ = ()
+
+
+class Period(URLWrapper):
+    """A year or a month of the archives, with its articles.
+
+    Its URL settings are the ``YEAR_ARCHIVE_*`` or ``MONTH_ARCHIVE_*`` ones,
+    which can use ``{year}``, ``{month}`` and ``{date}``, the first day of the
+    period.
+
+    :param year: the year
+    :param month: the month, or None for a whole year
+    """
+    __slots__ = ('year', 'month', 'articles', 'months')
+
+    def __init__(self, year, month, settings):
+        self.year = year
+        self.month = month
+        # the articles, in the order of the archives
+        self.articles = []
+        # the months of a year
+        self.months = []
+        if month is None:
+            name, setting_var = '%d' % year, 'YEAR_ARCHIVE'
+        else:
+            name, setting_var = '%d-%02d' % (year, month), 'MONTH_ARCHIVE'
+        super(Period, self).__init__(name, settings, setting_var)
+
+    @property
+    def date(self):
+        return datetime(self.year, self.month or 1, 1)
+
+    @property
+    def count(self):
+        return len(self.articles)
+
+    def as_dict(self):
+        values = super(Period, self).as_dict()
+        values.update(year=self.year, date=self.date)
+        if self.month is not None:
+            values['month'] = self.month
+        return values
+
+    def __getstate__(self):
+        state = super(Period, self).__getstate__()
+        state.update(year=self.year, month=self.month,
+                     articles=self.articles, months=self.months)
+        return state
+
+
+# the URL wrappers of the recent builds, by class and name, along with the
+# settings of the build, the most recent first. The settings are held so that
+# their identity cannot be reused, and only the registries of the last few
+# settings objects are kept.
+_url_wrappers = []
+_URL_WRAPPER_REGISTRIES = 4
+
+
+def _get_url_wrappers(settings):
+    """Return the URL wrappers registered for ``settings``."""
+    for owner, wrappers in _url_wrappers:
+        if owner is settings:
+            return wrappers
+    wrappers = {}
+    _url_wrappers.insert(0, (settings, wrappers))
+    del _url_wrappers[_URL_WRAPPER_REGISTRIES:]
+    return wrappers
+
+
+def get_url_wrapper(cls, name, settings):
+    """Return the ``cls`` URL wrapper (e.g. a Tag) named ``name``, creating
+    it the first time it is asked for during the build.
+
+    All the content objects of a build share the same instances, so each slug
+    is only computed once.
+    """
+    wrappers = _get_url_wrappers(settings)
+    wrapper = wrappers.get((cls, name))
+    if wrapper is None:
+        # the name is normalized by the class, e.g. " foo" and "foo" are the
+        # same tag
+        wrapper = intern_url_wrapper(cls(name, settings))
+        wrappers[(cls, name)] = wrapper
+    return wrapper
+
+
+def intern_url_wrapper(wrapper):
+    """Return the URL wrapper of the current build equal to ``wrapper``,
+    registering ``wrapper`` if there is none yet."""
+    return _get_url_wrappers(wrapper.settings).setdefault(
+        (wrapper.__class__, wrapper.name), wrapper)
+
+
+def clear_url_wrappers(settings=None):
+    """Forget the URL wrappers created with ``settings``, or all of them."""
+    if settings is None:
+        del _url_wrappers[:]
+    else:
+        _url_wrappers[:] = [item for item in _url_wrappers
+                            if item[0] is not settings]
 
 
 @python_2_unicode_compatible
@@ -2,11 +2,11 @@
 from __future__ import unicode_literals, print_function
 
 import os
+import json
 import math
 import random
 import logging
 import datetime
-import shutil
 
 from codecs import open
 from collections import defaultdict
@@ -15,13 +15,14 @@ from itertools import chain
 from operator import attrgetter, itemgetter
 
 from jinja2 import (Environment, FileSystemLoader, PrefixLoader, ChoiceLoader,
-                    BaseLoader, TemplateNotFound)
+                    BaseLoader, TemplateNotFound, FileSystemBytecodeCache)
 
-from pelican.contents import Article, Page, Category, StaticContent, \
-        is_valid_content, URLWrapper
-from pelican.readers import read_file
+from pelican.contents import Article, Page, Category, Period, \
+        StaticContent, is_valid_content, URLWrapper, get_url_wrapper
+from pelican.readers import read_files
 from pelican.utils import copy, process_translations, mkdir_p, \
-        get_relative_path
+        get_relative_path, LayeredContext, copy_file, list_tree, \
+        remove_stale_files
 from pelican.paginator import Paginator
 from pelican import signals
 
@@ -29,6 +30,51 @@ from pelican import signals
 logger = logging.getLogger(__name__)
 
 
+def _get_templates_path(settings, theme):
+    return [os.path.expanduser(os.path.join(theme, 'templates'))] + \
+            settings.get('EXTRA_TEMPLATES_PATHS', [])
+
+
+def create_environment(settings, theme):
+    """Return the Jinja2 environment used to render the templates of
+    ``theme``.
+
+    It is created once per build and shared by all the generators. If the
+    ``CACHE_TEMPLATES`` setting is set, the compiled templates are kept in
+    ``CACHE_PATH`` from one build to another.
+    """
+    theme_path = os.path.dirname(os.path.abspath(__file__))
+
+    bytecode_cache = None
+    if settings.get('CACHE_TEMPLATES'):
+        cache_path = os.path.join(settings.get('CACHE_PATH', 'cache'),
+                                  'templates')
+        mkdir_p(cache_path)
+        bytecode_cache = FileSystemBytecodeCache(cache_path)
+
+    simple_loader = FileSystemLoader(os.path.join(theme_path,
+                                     "themes", "simple", "templates"))
+    env = Environment(
+        trim_blocks=True,
+        loader=ChoiceLoader([
+            FileSystemLoader(_get_templates_path(settings, theme)),
+            simple_loader,  # implicit inheritance
+            PrefixLoader({'!simple': simple_loader})  # explicit one
+        ]),
+        extensions=settings.get('JINJA_EXTENSIONS', []),
+        bytecode_cache=bytecode_cache,
+    )
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # listing the templates walks the whole theme
+        logger.debug('template list: {0}'.format(env.list_templates()))
+
+    # get custom Jinja filters from user settings
+    custom_filters = settings.get('JINJA_FILTERS', {})
+    env.filters.update(custom_filters)
+    return env
+
+
 class Generator(object):
     """Baseclass generator"""
 
@@ -42,30 +88,11 @@ class Generator(object):
 
         # templates cache
         self._templates = {}
-        self._templates_path = []
-        self._templates_path.append(os.path.expanduser(
-                os.path.join(self.theme, 'templates')))
-        self._templates_path += self.settings.get('EXTRA_TEMPLATES_PATHS', [])
-
-        theme_path = os.path.dirname(os.path.abspath(__file__))
-
-        simple_loader = FileSystemLoader(os.path.join(theme_path,
-                                         "themes", "simple", "templates"))
-        self.env = Environment(
-            trim_blocks=True,
-            loader=ChoiceLoader([
-                FileSystemLoader(self._templates_path),
-                simple_loader,  # implicit inheritance
-                PrefixLoader({'!simple': simple_loader})  # explicit one
-            ]),
-            extensions=self.settings.get('JINJA_EXTENSIONS', []),
-        )
-
-        logger.debug('template list: {0}'.format(self.env.list_templates()))
+        self._templates_path = _get_templates_path(self.settings, self.theme)
 
-        # get custom Jinja filters from user settings
-        custom_filters = self.settings.get('JINJA_FILTERS', {})
-        self.env.filters.update(custom_filters)
+        # the environment is usually shared by all the generators of a build
+        if getattr(self, 'env', None) is None:
+            self.env = create_environment(self.settings, self.theme)
 
         signals.generator_init.send(self)
 
@@ -129,13 +156,15 @@ class Generator(object):
             # other stuff, just return for now
             return
 
-        localcontext = context.copy()
+        # the variables of this output are laid over the shared context
+        localcontext = {}
         if relative_urls:
             relative_path = get_relative_path(name)
             context['localsiteurl'] = relative_path
             localcontext['SITEURL'] = relative_path
 
         localcontext.update(kwargs)
+        localcontext = LayeredContext(localcontext, context)
 
         # check paginated
         paginated = paginated or {}
@@ -155,7 +184,7 @@ class Generator(object):
             # generated pages, and write
             name_root, ext = os.path.splitext(name)
             for page_num in range(list(paginators.values())[0].num_pages):
-                paginated_localcontext = localcontext.copy()
+                paginated_localcontext = localcontext.new_child()
                 for key in paginators.keys():
                     paginator = paginators[key]
                     page = paginator.page(page_num + 1)
@@ -172,19 +201,21 @@ class Generator(object):
                             page.previous_async_url = \
                                 urlwrapper.async_url(previous_page)
 
-                    paginated_localcontext.update(
+                    paginated_localcontext.maps[0].update(
                             {'%s_paginator' % key: paginator,
                              '%s_page' % key: page})
                 paginated_name = urlwrapper.paginated_save_as(paginated_localcontext['articles_page'])
 
                 self.writer.write_file(template, paginated_localcontext, self.output_path,
-                    paginated_name)
+                    paginated_name, context=context)
                 if self.settings['GENERATE_ASYNC_FILES']:
                     self.writer.write_file(self.get_template(urlwrapper.async_template), paginated_localcontext,
-                                self.output_path, urlwrapper.async_save_as(paginated_localcontext['articles_page']))
+                                self.output_path, urlwrapper.async_save_as(paginated_localcontext['articles_page']),
+                                context=context)
         else:
             # no pagination
-            self.writer.write_file(template, localcontext, self.output_path, name)
+            self.writer.write_file(template, localcontext, self.output_path,
+                                   name, context=context)
 
     def add_filename(self, content):
         location = os.path.relpath(os.path.abspath(content.filename),
@@ -222,13 +253,13 @@ class TemplatePagesGenerator(Generator):
 
     def generate_output(self, writer):
         for source, dest in self.settings['TEMPLATE_PAGES'].items():
-            self.env.loader.loaders.insert(0, _FileLoader(source, self.path))
-            try:
-                template = self.env.get_template(source)
-                rurls = self.settings.get('RELATIVE_URLS')
-                self.write_file(dest, template, self.context, rurls)
-            finally:
-                del self.env.loader.loaders[0]
+            # the shared environment is left untouched, and the cached theme
+            # templates do not shadow a source named like one of them
+            env = self.env.overlay(loader=ChoiceLoader([
+                _FileLoader(source, self.path), self.env.loader]))
+            template = env.get_template(source)
+            rurls = self.settings.get('RELATIVE_URLS')
+            self.write_file(dest, template, self.context, rurls)
 
 
 class ArticlesGenerator(Generator):
@@ -239,6 +270,9 @@ class ArticlesGenerator(Generator):
         self.articles = []  # only articles in default language
         self.translations = []
         self.dates = {}
+        self._dates_index = None
+        self.years = []
+        self.months = []
         self.tags = defaultdict(list)
         self.categories = defaultdict(list)
         self.related_posts = []
@@ -318,9 +352,9 @@ class ArticlesGenerator(Generator):
     def generate_articles(self, write):
         """Generate the articles."""
         for article in chain(self.translations, self.articles):
-            article._context['content'] = article.content
             write(article.save_as, self.get_template(article.template),
-                article._context, article=article, category=article.category)
+                article._context, article=article, category=article.category,
+                content=article.content)
 
     def generate_direct_templates(self, write):
         """Generate direct templates pages"""
@@ -340,12 +374,23 @@ class ArticlesGenerator(Generator):
                   self.context, blog=True, paginated=paginated,
                   urlwrapper=urlwrapper, page_name=template)
 
+    def filter_dates(self, articles):
+        """Return the given articles which are in ``self.dates``, in the
+        order of ``self.dates``."""
+        if self._dates_index is None or self._dates_index[0] is not self.dates:
+            self._dates_index = (self.dates, dict(
+                (article, i) for i, article in enumerate(self.dates)))
+        dates, index = self._dates_index
+        positions = sorted(set(index[article] for article in articles
+                               if article in index))
+        return [dates[i] for i in positions]
+
     def generate_tags(self, write):
         """Generate Tags pages."""
         tag_template = self.get_template('tag')
         for tag, articles in self.tags.items():
             articles.sort(key=attrgetter('date'), reverse=True)
-            dates = [article for article in self.dates if article in articles]
+            dates = self.filter_dates(articles)
             write(tag.save_as, tag_template, self.context, tag=tag,
                 articles=articles, dates=dates, urlwrapper=tag,
                 paginated={'articles': articles, 'dates': dates},
@@ -355,7 +400,7 @@ class ArticlesGenerator(Generator):
         """Generate category pages."""
         category_template = self.get_template('category')
         for cat, articles in self.categories:
-            dates = [article for article in self.dates if article in articles]
+            dates = self.filter_dates(articles)
             write(cat.save_as, category_template, self.context,
                 category=cat, articles=articles, dates=dates, urlwrapper=cat,
                 paginated={'articles': articles, 'dates': dates},
@@ -365,12 +410,32 @@ class ArticlesGenerator(Generator):
         """Generate Author pages."""
         author_template = self.get_template('author')
         for aut, articles in self.authors:
-            dates = [article for article in self.dates if article in articles]
+            dates = self.filter_dates(articles)
             write(aut.save_as, author_template, self.context,
                 author=aut, articles=articles, dates=dates, urlwrapper=aut,
                 paginated={'articles': articles, 'dates': dates},
                 page_name=aut.page_name)
 
+    def generate_period_archives(self, write):
+        """Generate the archives of each year and each month, if their
+        YEAR_ARCHIVE_SAVE_AS and MONTH_ARCHIVE_SAVE_AS settings are set."""
+        template = None
+        for periods, key in ((self.years, 'YEAR_ARCHIVE_SAVE_AS'),
+                             (self.months, 'MONTH_ARCHIVE_SAVE_AS')):
+            if not self.settings.get(key):
+                continue
+            if template is None:
+                template = self.get_template('period_archives')
+            for period in periods:
+                articles = sorted(period.articles, key=attrgetter('date'),
+                                  reverse=True)
+                write(period.save_as, template, self.context, period=period,
+                    articles=articles, dates=period.articles,
+                    urlwrapper=period,
+                    paginated={'articles': articles,
+                               'dates': period.articles},
+                    page_name=period.page_name)
+
     def generate_drafts(self, write):
         """Generate drafts pages."""
         for article in self.drafts:
@@ -382,6 +447,7 @@ class ArticlesGenerator(Generator):
         """Generate the pages on the disk"""
         write = partial(self.write_file,
                         relative_urls=self.settings.get('RELATIVE_URLS'))
+        self._dates_index = None  # self.dates may have been changed since
 
         # to minimize the number of relative path stuff modification
         # in writer, articles pass first
@@ -392,6 +458,7 @@ class ArticlesGenerator(Generator):
         self.generate_tags(write)
         self.generate_categories(write)
         self.generate_authors(write)
+        self.generate_period_archives(write)
         self.generate_drafts(write)
         signals.article_generate_pages.send(self, write=write)
 
@@ -402,14 +469,13 @@ class ArticlesGenerator(Generator):
             os.path.join(self.path, self.settings['ARTICLE_DIR'])
         )
         all_articles = []
-        for f in self.get_files(
-                article_path,
-                exclude=self.settings['ARTICLE_EXCLUDES']):
-            try:
-                signals.article_generate_preread.send(self)
-                content, metadata = read_file(f, settings=self.settings)
-            except Exception as e:
-                logger.warning('Could not process %s\n%s' % (f, str(e)))
+        files = self.get_files(article_path,
+                               exclude=self.settings['ARTICLE_EXCLUDES'])
+        for f, content, metadata, error in read_files(files, self.settings,
+                self.settings.get('READ_WORKERS', 1),
+                preread=partial(signals.article_generate_preread.send, self)):
+            if error is not None:
+                logger.warning('Could not process %s\n%s' % (f, error))
                 continue
 
             # if no category is set, use the name of the path as a category
@@ -424,7 +490,8 @@ class ArticlesGenerator(Generator):
                     category = self.settings['DEFAULT_CATEGORY']
 
                 if category != '':
-                    metadata['category'] = [Category(category, self.settings)]
+                    metadata['category'] = [get_url_wrapper(
+                        Category, category, self.settings)]
 
             if 'date' not in metadata and self.settings.get('DEFAULT_DATE'):
                 if self.settings['DEFAULT_DATE'] == 'fs':
@@ -471,6 +538,20 @@ class ArticlesGenerator(Generator):
         self.dates.sort(key=attrgetter('date'),
                 reverse=self.context['NEWEST_FIRST_ARCHIVES'])
 
+        # group the archives by year and by month
+        self.years, self.months = [], []
+        for article in self.dates:
+            date = article.date
+            if not self.years or self.years[-1].year != date.year:
+                self.years.append(Period(date.year, None, self.settings))
+            year = self.years[-1]
+            if not year.months or year.months[-1].month != date.month:
+                year.months.append(Period(date.year, date.month,
+                                          self.settings))
+                self.months.append(year.months[-1])
+            year.articles.append(article)
+            year.months[-1].articles.append(article)
+
         # create tag cloud
         tag_cloud = defaultdict(int)
         for article in self.articles:
@@ -509,7 +590,8 @@ class ArticlesGenerator(Generator):
         self.authors.sort(key=lambda item: item[0].name)
 
         self._update_context(('articles', 'dates', 'tags', 'categories',
-                              'tag_cloud', 'authors', 'related_posts'))
+                              'tag_cloud', 'authors', 'related_posts',
+                              'years', 'months'))
 
         signals.article_generator_finalized.send(self)
 
@@ -531,13 +613,13 @@ class PagesGenerator(Generator):
     def generate_context(self):
         all_pages = []
         hidden_pages = []
-        for f in self.get_files(
+        files = self.get_files(
                 os.path.join(self.path, self.settings['PAGE_DIR']),
-                exclude=self.settings['PAGE_EXCLUDES']):
-            try:
-                content, metadata = read_file(f, settings=self.settings)
-            except Exception as e:
-                logger.warning('Could not process %s\n%s' % (f, str(e)))
+                exclude=self.settings['PAGE_EXCLUDES'])
+        for f, content, metadata, error in read_files(files, self.settings,
+                self.settings.get('READ_WORKERS', 1)):
+            if error is not None:
+                logger.warning('Could not process %s\n%s' % (f, error))
                 continue
             signals.pages_generate_context.send(self, metadata=metadata)
             page = Page(content, metadata, settings=self.settings,
@@ -574,12 +656,9 @@ class StaticGenerator(Generator):
     """copy static paths (what you want to copy, like images, medias etc.
     to output"""
 
-    def _copy_paths(self, paths, source, destination, output_path,
-            final_path=None):
-        """Copy all the paths from source to destination"""
-        for path in paths:
-            copy(path, source, os.path.join(output_path, destination),
-                 final_path, overwrite=True)
+    # The name of the file listing the files synchronized by the last build,
+    # in the CACHE_PATH directory
+    MANIFEST_NAME = 'static_files.json'
 
     def generate_context(self):
         self.staticfiles = []
@@ -601,13 +680,57 @@ class StaticGenerator(Generator):
             self.context['filenames'][src] = sc
 
     def generate_output(self, writer):
-        self._copy_paths(self.settings['THEME_STATIC_PATHS'], self.theme,
-                         'theme', self.output_path, '.')
-        # copy all StaticContent files
+        mode = self.settings['STATIC_COPY_MODE']
+        theme_paths = [os.path.join(self.theme, path)
+                       for path in self.settings['THEME_STATIC_PATHS']]
+        files = list_tree(theme_paths, os.path.join(self.output_path,
+                                                    'theme'))
         for sc in self.staticfiles:
-            mkdir_p(os.path.dirname(sc.save_as))
-            shutil.copy(sc.filepath, sc.save_as)
-            logger.info('copying %s to %s' % (sc.filepath, sc.save_as))
+            save_as = os.path.normpath(sc.save_as)
+            if os.path.isdir(sc.filepath):
+                files.update(list_tree([sc.filepath], save_as))
+            else:
+                files[save_as] = sc.filepath
+
+        # copy the new and modified files
+        for save_as in sorted(files):
+            if copy_file(files[save_as], save_as, mode):
+                logger.info('copying %s to %s' % (files[save_as], save_as))
+
+        # with incremental builds, remove the files synchronized by the
+        # previous build which are not in the sources anymore. The other
+        # files of the output directory, e.g. the ones written by plugins,
+        # are never removed.
+        if not self.settings.get('INCREMENTAL_BUILD'):
+            return
+        manifest_path = os.path.join(self.settings.get('CACHE_PATH', 'cache'),
+                                     self.MANIFEST_NAME)
+        synchronized = set(os.path.relpath(path, self.output_path)
+                           for path in files)
+        stale = [os.path.join(self.output_path, path) for path in
+                 self._read_manifest(manifest_path) - synchronized]
+        for path in remove_stale_files(stale, self.output_path):
+            logger.info('removing %s' % path)
+        self._write_manifest(manifest_path, synchronized)
+
+    @staticmethod
+    def _read_manifest(manifest_path):
+        """Return the set of the files listed in the manifest, relative to
+        the output directory."""
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                return set(json.load(f))
+        except (IOError, OSError, ValueError):
+            return set()
+
+    @staticmethod
+    def _write_manifest(manifest_path, synchronized):
+        """Write the list of the synchronized files in the manifest."""
+        directory = os.path.dirname(manifest_path)
+        if directory:
+            mkdir_p(directory)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(sorted(synchronized)))
 
 
 class PdfGenerator(Generator):
@@ -2,15 +2,20 @@
 '''A plugin to create .gz cache files for optimization.'''
 
 import gzip
+import json
 import logging
+import multiprocessing
 import os
+import shutil
+import struct
+from multiprocessing.pool import ThreadPool
 
 from pelican import signals
 
 logger = logging.getLogger(__name__)
 
-# A list of file types to exclude from possible compression
-EXCLUDE_TYPES = [
+# A set of file types to exclude from possible compression
+EXCLUDE_TYPES = set([
     # Compressed types
     '.bz2',
     '.gz',
@@ -31,48 +36,174 @@ EXCLUDE_TYPES = [
     '.avi',
     '.mov',
     '.mp4',
-]
+])
+
+# The name of the file listing the .gz files created by the plugin, in the
+# CACHE_PATH directory
+MANIFEST_NAME = 'gzip_cache.json'
 
 def create_gzip_cache(pelican):
     '''Create a gzip cache file for every file that a webserver would
     reasonably want to cache (e.g., text type files).
 
+    The files whose cache file is up to date are skipped, and the others are
+    compressed in a pool of GZIP_CACHE_WORKERS threads (zlib releases the GIL
+    while compressing). With INCREMENTAL_BUILD, the cache files created by a
+    previous build which are not needed anymore are removed.
+
     :param pelican: The Pelican instance
     '''
-    for dirpath, _, filenames in os.walk(pelican.settings['OUTPUT_PATH']):
+    settings = pelican.settings
+    output_path = settings['OUTPUT_PATH']
+    level = settings.get('GZIP_CACHE_LEVEL', 9)
+    min_size = settings.get('GZIP_CACHE_MIN_SIZE', 0)
+    workers = settings.get('GZIP_CACHE_WORKERS') or \
+            multiprocessing.cpu_count()
+
+    filepaths = []
+    for dirpath, _, filenames in os.walk(output_path):
         for name in filenames:
             if should_compress(name):
                 filepath = os.path.join(dirpath, name)
-                create_gzip_file(filepath)
+                if os.path.getsize(filepath) >= min_size:
+                    filepaths.append(filepath)
+
+    def update(filepath):
+        if is_up_to_date(filepath):
+            return False
+        create_gzip_file(filepath, level)
+        return True
+
+    if workers > 1 and len(filepaths) > 1:
+        pool = ThreadPool(min(workers, len(filepaths)))
+        try:
+            updated = sum(pool.map(update, filepaths))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        updated = sum(update(filepath) for filepath in filepaths)
+    logger.info('Compressed %d files, %d were up to date' % (
+        updated, len(filepaths) - updated))
+
+    # the orphans are only tracked with incremental builds, which already
+    # keep their state in CACHE_PATH
+    if not settings.get('INCREMENTAL_BUILD'):
+        return
+    manifest_path = os.path.join(settings.get('CACHE_PATH', 'cache'),
+                                 MANIFEST_NAME)
+    compressed = set(os.path.relpath(filepath, output_path) + '.gz'
+                     for filepath in filepaths)
+    remove_orphans(output_path, read_manifest(manifest_path) - compressed)
+    write_manifest(manifest_path, compressed)
 
 def should_compress(filename):
     '''Check if the filename is a type of file that should be compressed.
 
     :param filename: A file name to check against
     '''
-    for extension in EXCLUDE_TYPES:
-        if filename.endswith(extension):
-            return False
+    return os.path.splitext(filename)[1].lower() not in EXCLUDE_TYPES
+
+def is_up_to_date(filepath):
+    '''Check if the gzip cache file of a filepath does not need to be
+    created again.
 
-    return True
+    The cache file gets the modification time of the file when it is
+    created. It is up to date when it still has that time and the size of
+    the file, or when its uncompressed content is the same as the content of
+    the file, in which case its modification time is updated. The time of
+    the file is not compared with the time of the cache file, since static
+    files are copied to the output with the time of their source, which can
+    be older than the cache file.
+
+    :param filepath: A file to check the cache file of
+    '''
+    compressed_path = filepath + '.gz'
+    try:
+        stat = os.stat(filepath)
+        if os.path.getmtime(compressed_path) == stat.st_mtime and \
+                uncompressed_size(compressed_path) == stat.st_size % 2 ** 32:
+            return True
+    except (IOError, OSError):
+        return False
+
+    try:
+        compressed = gzip.open(compressed_path, 'rb')
+        try:
+            cached_content = compressed.read()
+        finally:
+            compressed.close()
+        with open(filepath, 'rb') as uncompressed:
+            if cached_content != uncompressed.read():
+                return False
+        shutil.copystat(filepath, compressed_path)
+        return True
+    except (IOError, OSError, EOFError):
+        return False
+
+def uncompressed_size(compressed_path):
+    '''Return the size of the uncompressed content of a gzip file, modulo
+    2 ** 32, as stored at its end.
+
+    :param compressed_path: A gzip file
+    '''
+    with open(compressed_path, 'rb') as compressed:
+        compressed.seek(-4, os.SEEK_END)
+        return struct.unpack('<I', compressed.read(4))[0]
 
-def create_gzip_file(filepath):
+def create_gzip_file(filepath, level=9):
     '''Create a gzipped file in the same directory with a filepath.gz name.
 
     :param filepath: A file to compress
+    :param level: The compression level, from 1 (fastest) to 9 (smallest)
     '''
     compressed_path = filepath + '.gz'
 
     with open(filepath, 'rb') as uncompressed:
+        compressed = None
         try:
             logger.debug('Compressing: %s' % filepath)
-            compressed = gzip.open(compressed_path, 'wb')
-            compressed.writelines(uncompressed)
+            compressed = gzip.open(compressed_path, 'wb', level)
+            compressed.write(uncompressed.read())
         except Exception as ex:
             logger.critical('Gzip compression failed: %s' % ex)
+            return
         finally:
-            compressed.close()
+            if compressed is not None:
+                compressed.close()
+    # the cache file is up to date as long as the file keeps this time
+    shutil.copystat(filepath, compressed_path)
+
+def remove_orphans(output_path, orphans):
+    '''Remove the gzip cache files created by a previous build whose file
+    has been removed or is not compressed anymore (e.g., it is too small).
+
+    :param output_path: The output directory
+    :param orphans: The paths of the cache files, relative to output_path
+    '''
+    for orphan in orphans:
+        compressed_path = os.path.join(output_path, orphan)
+        try:
+            os.remove(compressed_path)
+            logger.debug('Removed orphaned %s' % compressed_path)
+        except OSError:
+            pass
+
+def read_manifest(manifest_path):
+    '''Return the set of the cache files listed in the manifest.'''
+    try:
+        with open(manifest_path) as f:
+            return set(json.load(f))
+    except (IOError, OSError, ValueError):
+        return set()
+
+def write_manifest(manifest_path, compressed):
+    '''Write the list of the cache files in the manifest.'''
+    directory = os.path.dirname(manifest_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(manifest_path, 'w') as f:
+        json.dump(sorted(compressed), f)
 
 def register():
     signals.finalized.connect(create_gzip_cache)
-
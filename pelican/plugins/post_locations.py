@@ -128,8 +128,7 @@ def generate_locations_pages(article_generator, write):
     location_template = article_generator.get_template('location')
     for location, articles in article_generator.locations.items():
         articles = sorted(articles, key=attrgetter('date'), reverse=True)
-        dates = [article for article in article_generator.dates
-                 if article in articles]
+        dates = article_generator.filter_dates(articles)
         write(location.save_as,
               location_template,
               article_generator.context,
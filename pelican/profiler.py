@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import json
+import time
+import logging
+
+try:
+    import cProfile
+except ImportError:
+    cProfile = None  # NOQA
+
+logger = logging.getLogger(__name__)
+
+# the time spent by the process on the CPU
+_cpu_time = getattr(time, 'process_time', None) or time.clock
+
+# the profiler recording the timings of the current build, if any
+_current = None
+
+# the categories of the timings, in the order of the report
+PHASE = 'phase'
+CATEGORIES = (PHASE, 'read', 'render', 'feed')
+
+
+def clock():
+    """Return the current wall-clock and CPU times."""
+    return time.time(), _cpu_time()
+
+
+def elapsed(start):
+    """Return the wall-clock and CPU times elapsed since ``start``, a value
+    returned by :func:`clock`."""
+    wall, cpu = clock()
+    return wall - start[0], cpu - start[1]
+
+
+def record(category, name, times):
+    """Record the ``(wall, cpu)`` times of an operation if a build is being
+    profiled.
+
+    This is used for the operations done in worker processes, which return
+    their times to the main process.
+    """
+    if _current is not None:
+        _current.add(category, name, times)
+
+
+class _Measure(object):
+
+    def __init__(self, profiler, category, name):
+        self.profiler = profiler
+        self.category = category
+        self.name = name
+
+    def __enter__(self):
+        self.start = clock()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add(self.category, self.name, elapsed(self.start))
+
+
+class _NoMeasure(object):
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_NO_MEASURE = _NoMeasure()
+
+
+def measure(category, name):
+    """Return a context manager recording the time spent in its block if a
+    build is being profiled, e.g.::
+
+        with profiler.measure('read', filename):
+            content, metadata = read_file(filename)
+    """
+    if _current is None:
+        return _NO_MEASURE
+    return _Measure(_current, category, name)
+
+
+class Profiler(object):
+    """Record the wall-clock and CPU times spent in the phases of a build, and
+    in the reading, rendering and writing of each file.
+
+    :param top: the number of files listed for each category in the report
+    """
+
+    def __init__(self, top=10):
+        self.top = top
+        self.timings = []
+
+    def add(self, category, name, times):
+        self.timings.append((category, name, times[0], times[1]))
+
+    def start(self):
+        global _current
+        _current = self
+
+    def stop(self):
+        global _current
+        _current = None
+
+    def totals(self):
+        """Return a dict of the ``(count, wall, cpu)`` totals by category."""
+        totals = {}
+        for category, name, wall, cpu in self.timings:
+            count, total_wall, total_cpu = totals.get(category, (0, 0, 0))
+            totals[category] = count + 1, total_wall + wall, total_cpu + cpu
+        return totals
+
+    def report(self):
+        """Return the report of the build, as a string."""
+        lines = ['Build profile (wall-clock / CPU seconds)', '']
+        phases = [t for t in self.timings if t[0] == PHASE]
+        for category, name, wall, cpu in phases:
+            lines.append('  %-56s %8.3f %8.3f' % (name, wall, cpu))
+
+        totals = self.totals()
+        for category in CATEGORIES[1:]:
+            if category not in totals:
+                continue
+            count, wall, cpu = totals[category]
+            lines += ['', '%d %s operations: %.3f / %.3f, slowest ones:' % (
+                count, category, wall, cpu)]
+            slowest = sorted((t for t in self.timings if t[0] == category),
+                             key=lambda t: t[2], reverse=True)
+            for _, name, wall, cpu in slowest[:self.top]:
+                lines.append('  %-56s %8.3f %8.3f' % (name, wall, cpu))
+        return '\n'.join(lines)
+
+    def dump(self, filename):
+        """Write the timings and their totals to ``filename`` as JSON."""
+        totals = self.totals()
+        with open(filename, 'w') as f:
+            json.dump({
+                'totals': dict((category, {'count': count, 'wall': wall,
+                                           'cpu': cpu})
+                               for category, (count, wall, cpu)
+                               in totals.items()),
+                'timings': [{'category': category, 'name': name,
+                             'wall': wall, 'cpu': cpu}
+                            for category, name, wall, cpu in self.timings],
+            }, f, indent=2)
+
+
+def profile(func, top=10, output=None):
+    """Call ``func`` while recording the timings of the build, and print the
+    report.
+
+    :param top: the number of files listed for each category in the report
+    :param output: the file to write the timings to, as JSON if its name
+        ends with ``.json``. Otherwise ``func`` also runs under cProfile,
+        whose statistics are written to the file, to be read with the
+        :mod:`pstats` module or a tool such as SnakeViz.
+    """
+    profiler = Profiler(top)
+    stats = None
+    if output and not output.endswith('.json') and cProfile is not None:
+        stats = cProfile.Profile()
+    profiler.start()
+    if stats is not None:
+        stats.enable()
+    try:
+        with measure(PHASE, 'total'):
+            return func()
+    finally:
+        if stats is not None:
+            stats.disable()
+        profiler.stop()
+        print(profiler.report())
+        if stats is not None:
+            stats.dump_stats(output)
+            logger.info('cProfile statistics written to %s' % output)
+        elif output:
+            profiler.dump(output)
+            logger.info('Build profile written to %s' % output)
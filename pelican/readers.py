@@ -4,10 +4,16 @@ import six
 
 import os
 import re
+import multiprocessing
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle  # NOQA
 try:
     import docutils
     import docutils.core
     import docutils.io
+    import docutils.utils
     from docutils.writers.html4css1 import HTMLTranslator
 
     # import the directives to have pygments support
@@ -25,22 +31,29 @@ except ImportError:
     asciidoc = False
 import re
 
-from pelican.contents import Category, Tag, Author
+from pelican import profiler
+from pelican.cache import get_reader_cache
+from pelican.contents import (Category, Tag, Author, URLWrapper,
+                              get_url_wrapper, intern_url_wrapper)
 from pelican.utils import get_date, pelican_open
 
 
 _METADATA_PROCESSORS = {
-    'tags': lambda x, y: [Tag(tag, y) for tag in x.split(',')],
+    'tags': lambda x, y: [get_url_wrapper(Tag, tag, y)
+                          for tag in x.split(',')],
     'date': lambda x, y: get_date(x),
     'status': lambda x, y: x.strip(),
-    'category': lambda x, y: [Category(cat, y) for cat in x.split(',')],
-    'author': Author
+    'category': lambda x, y: [get_url_wrapper(Category, cat, y)
+                              for cat in x.split(',')],
+    'author': lambda x, y: get_url_wrapper(Author, x, y),
 }
 
 
 class Reader(object):
     enabled = True
     extensions = None
+    # the other files read by the last call to read(), e.g. included files
+    dependencies = ()
 
     def __init__(self, settings):
         self.settings = settings
@@ -109,13 +122,29 @@ class RstReader(Reader):
                 output[name] = self.process_metadata(name, value)
         return output
 
+    # docutils settings shared by all the files, since building them is a
+    # large part of the time spent on short documents
+    _publisher_settings = None
+
+    def _get_publisher_settings(self, pub):
+        cls = self.__class__
+        if cls._publisher_settings is None:
+            # only the body is used, the stylesheet does not need to be read
+            extra_params = {'initial_header_level': '2',
+                            'embed_stylesheet': False}
+            pub.process_programmatic_settings(None, extra_params, None)
+            cls._publisher_settings = pub.settings
+        # the settings are updated while processing a document
+        settings = cls._publisher_settings.copy()
+        settings.record_dependencies = docutils.utils.DependencyList()
+        return settings
+
     def _get_publisher(self, filename):
-        extra_params = {'initial_header_level': '2'}
         pub = docutils.core.Publisher(
             destination_class=docutils.io.StringOutput)
         pub.set_components('standalone', 'restructuredtext', 'html')
         pub.writer.translator_class = PelicanHTMLTranslator
-        pub.process_programmatic_settings(None, extra_params, None)
+        pub.settings = self._get_publisher_settings(pub)
         pub.set_source(source_path=filename)
         pub.publish()
         return pub
@@ -123,6 +152,8 @@ class RstReader(Reader):
     def read(self, filename):
         """Parses restructured text"""
         pub = self._get_publisher(filename)
+        self.dependencies = [os.path.abspath(path) for path in
+                             pub.settings.record_dependencies.list]
         parts = pub.writer.parts
         content = parts.get('body')
 
@@ -137,9 +168,24 @@ class MarkdownReader(Reader):
     file_extensions = ['md', 'markdown', 'mkd']
     extensions = ['codehilite', 'extra']
 
+    # Markdown instances, by extensions, reused from one document to another
+    # since loading the extensions is costly
+    _instances = {}
+
+    def _get_markdown(self):
+        """Return a Markdown instance ready to convert a new document."""
+        key = tuple(self.extensions)
+        md = self._instances.get(key)
+        if md is None:
+            md = Markdown(extensions=set(self.extensions + ['meta']))
+            self._instances[key] = md
+        else:
+            md.reset()
+        return md
+
     def _parse_metadata(self, meta):
         """Return the dict containing document metadata"""
-        md = Markdown(extensions=set(self.extensions + ['meta']))
+        md = self._get_markdown()
         output = {}
         for name, value in meta.items():
             name = name.lower()
@@ -154,10 +200,11 @@ class MarkdownReader(Reader):
     def read(self, filename):
         """Parse content and metadata of markdown files"""
         text = pelican_open(filename)
-        md = Markdown(extensions=set(self.extensions + ['meta']))
+        md = self._get_markdown()
         content = md.convert(text)
 
-        metadata = self._parse_metadata(md.Meta)
+        # the metadata have to be kept apart before the summary is converted
+        metadata = self._parse_metadata(dict(md.Meta))
         return content, metadata
 
 
@@ -216,6 +263,23 @@ for cls in Reader.__subclasses__():
         _EXTENSIONS[ext] = cls
 
 
+def _bind_wrapper(item, settings):
+    if not isinstance(item, URLWrapper):
+        return item
+    item.settings = settings
+    return intern_url_wrapper(item)
+
+
+def _bind_settings(metadata, settings):
+    """Attach the settings back to the URL wrappers of unpickled metadata,
+    and replace them with the ones of the current build if there are."""
+    for key, value in list(metadata.items()):
+        if isinstance(value, list):
+            metadata[key] = [_bind_wrapper(item, settings) for item in value]
+        else:
+            metadata[key] = _bind_wrapper(value, settings)
+
+
 def read_file(filename, fmt=None, settings=None):
     """Return a reader object using the given format."""
     base, ext = os.path.splitext(os.path.basename(filename))
@@ -234,6 +298,15 @@ def read_file(filename, fmt=None, settings=None):
     if not reader.enabled:
         raise ValueError("Missing dependencies for %s" % fmt)
 
+    cache = get_reader_cache(settings)
+    if cache is not None:
+        key = cache.get_key(filename, reader, settings)
+        cached = cache.get(key)
+        if cached is not None:
+            content, metadata = cached
+            _bind_settings(metadata, settings)
+            return content, metadata
+
     content, metadata = reader.read(filename)
 
     # eventually filter the content with typogrify if asked so
@@ -252,4 +325,83 @@ def read_file(filename, fmt=None, settings=None):
                     k = k.lower()  # metadata must be lowercase
                     metadata[k] = reader.process_metadata(k, v)
 
+    if cache is not None:
+        cache.set(key, (content, metadata), reader.dependencies)
+
     return content, metadata
+
+
+_worker_settings = None
+
+
+def _init_read_worker(settings):
+    global _worker_settings
+    _worker_settings = settings
+
+
+def _read_file_worker(filename):
+    start = profiler.clock()
+    try:
+        content, metadata = read_file(filename, settings=_worker_settings)
+    except Exception as e:
+        return None, None, str(e), profiler.elapsed(start)
+    return content, metadata, None, profiler.elapsed(start)
+
+
+def _picklable_settings(settings):
+    """Return the settings which can be sent to the reading processes."""
+    picklable = {}
+    for key, value in (settings or {}).items():
+        try:
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            continue
+        picklable[key] = value
+    return picklable
+
+
+def read_files(filenames, settings=None, workers=1, preread=None):
+    """Read the given files, in a pool of ``workers`` processes if more than
+    one is asked for.
+
+    Yield a ``(filename, content, metadata, error)`` tuple for each file, in
+    the order of ``filenames``; ``error`` is the message of the exception
+    raised while reading the file, if any.
+
+    :param preread: callable to call before reading each file
+    """
+    filenames = list(filenames)
+    if not workers or workers <= 1 or len(filenames) <= 1:
+        for filename in filenames:
+            try:
+                if preread is not None:
+                    preread()
+                with profiler.measure('read', filename):
+                    content, metadata = read_file(filename,
+                                                  settings=settings)
+            except Exception as e:
+                yield filename, None, None, str(e)
+            else:
+                yield filename, content, metadata, None
+        return
+
+    if preread is not None:
+        for filename in filenames:
+            preread()
+
+    workers = min(workers, len(filenames))
+    chunksize = max(1, len(filenames) // (workers * 4))
+    pool = multiprocessing.Pool(workers, _init_read_worker,
+                                (_picklable_settings(settings),))
+    try:
+        results = pool.imap(_read_file_worker, filenames, chunksize)
+        for filename, (content, metadata, error, times) in zip(filenames,
+                                                               results):
+            profiler.record('read', filename, times)
+            if error is None:
+                _bind_settings(metadata, settings)
+            yield filename, content, metadata, error
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
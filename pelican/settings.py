@@ -72,6 +72,19 @@ _DEFAULT_CONFIG = {'PATH': '.',
                    'AUTHOR_SAVE_AS': 'author/{slug}.html',
                    'AUTHOR_PAGINATED_SAVE_AS': 'author/{slug}-{page}.html',
                    'AUTHOR_ASYNC_TEMPLATE': 'author_async',
+                   'YEAR_ARCHIVE_URL': 'posts/{year}/index.html',
+                   'YEAR_ARCHIVE_PAGINATED_URL': 'posts/{year}/index{page}.html',
+                   'YEAR_ARCHIVE_SAVE_AS': False,
+                   'YEAR_ARCHIVE_PAGINATED_SAVE_AS':
+                       'posts/{year}/index{page}.html',
+                   'YEAR_ARCHIVE_ASYNC_TEMPLATE': 'period_archives_async',
+                   'MONTH_ARCHIVE_URL': 'posts/{year}/{month:02d}/index.html',
+                   'MONTH_ARCHIVE_PAGINATED_URL':
+                       'posts/{year}/{month:02d}/index{page}.html',
+                   'MONTH_ARCHIVE_SAVE_AS': False,
+                   'MONTH_ARCHIVE_PAGINATED_SAVE_AS':
+                       'posts/{year}/{month:02d}/index{page}.html',
+                   'MONTH_ARCHIVE_ASYNC_TEMPLATE': 'period_archives_async',
                    'RELATIVE_URLS': True,
                    'DEFAULT_LANG': 'en',
                    'TAG_CLOUD_STEPS': 4,
@@ -96,7 +109,16 @@ _DEFAULT_CONFIG = {'PATH': '.',
                    'TYPOGRIFY': False,
                    'SUMMARY_MAX_LENGTH': 50,
                    'PLUGINS': [],
-                   'TEMPLATE_PAGES': {}
+                   'TEMPLATE_PAGES': {},
+                   'CACHE_PATH': 'cache',
+                   'CACHE_CONTENT': False,
+                   'CACHE_CONTENT_MAX_SIZE': 100 * 1024 * 1024,
+                   'CACHE_TEMPLATES': False,
+                   'INCREMENTAL_BUILD': False,
+                   'READ_WORKERS': 1,
+                   'WRITE_WORKERS': 1,
+                   'STATIC_COPY_MODE': 'copy',
+                   'STREAM_OUTPUT': False,
                    }
 
 
@@ -104,7 +126,7 @@ def read_settings(filename=None, override=None):
     if filename:
         local_settings = get_settings_from_file(filename)
         # Make the paths relative to the settings file
-        for p in ['PATH', 'OUTPUT_PATH', 'THEME']:
+        for p in ['PATH', 'OUTPUT_PATH', 'THEME', 'CACHE_PATH']:
             if p in local_settings and local_settings[p] is not None \
                     and not isabs(local_settings[p]):
                 absp = os.path.abspath(os.path.normpath(os.path.join(
@@ -224,6 +246,19 @@ def configure_settings(settings):
                        " falling back to the default extension " +
                        _DEFAULT_CONFIG['OUTPUT_SOURCES_EXTENSION'])
 
+    for key in ('READ_WORKERS', 'WRITE_WORKERS'):
+        workers = settings.get(key)
+        if not isinstance(workers, int) or workers < 1:
+            logger.warn("Detected misconfiguration with %s setting (must be "
+                        "a positive integer), falling back to 1" % key)
+            settings[key] = 1
+
+    if settings.get('STATIC_COPY_MODE') not in ('copy', 'hardlink', 'reflink'):
+        logger.warn("Detected misconfiguration with STATIC_COPY_MODE setting "
+                    "(must be 'copy', 'hardlink' or 'reflink'), falling back "
+                    "to 'copy'")
+        settings['STATIC_COPY_MODE'] = 'copy'
+
     filename_metadata = settings.get('FILENAME_METADATA')
     if filename_metadata and not isinstance(filename_metadata, six.string_types):
         logger.error("Detected misconfiguration with FILENAME_METADATA"
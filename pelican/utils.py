@@ -2,6 +2,7 @@
 from __future__ import unicode_literals, print_function
 import six
 
+import io
 import os
 import re
 import pytz
@@ -9,7 +10,9 @@ import shutil
 import logging
 import errno
 import locale
-from collections import defaultdict, Hashable
+import filecmp
+import unicodedata
+from collections import defaultdict, Hashable, Mapping
 from functools import partial
 
 from codecs import open
@@ -17,6 +20,7 @@ from datetime import datetime
 from itertools import groupby
 from jinja2 import Markup
 from operator import attrgetter
+from unidecode import unidecode
 
 logger = logging.getLogger(__name__)
 
@@ -72,7 +76,6 @@ def strftime(date, date_format):
         return result
 
 
-
 #----------------------------------------------------------------------------
 # Stolen from Django: django.utils.encoding
 #
@@ -122,22 +125,187 @@ class memoized(object):
       '''Support instance methods.'''
       return partial(self.__call__, obj)
 
+
+# the directives of strftime whose output depends on the locale, see
+# DateFormatter
+_LOCALE_DIRECTIVE_RE = re.compile(r'%([aAbBp%])')
+_LOCALE_FORMAT_RE = re.compile(r'%([cxX%])')
+# the E and O modifiers select the alternative era and digits of a locale
+_LOCALE_MODIFIER_RE = re.compile(r'%([EO%])')
+
+
+class DateFormatter(object):
+    """Format dates like :func:`strftime` would in a given locale, without
+    changing the locale of the process.
+
+    The names of the days and the months of the locale, and its date and time
+    formats, are looked up once, when the formatter is created. If the locale
+    is not available, a :class:`locale.Error` is raised.
+
+    The directives using the ``E`` and ``O`` modifiers, e.g. ``%EY`` or
+    ``%Od``, depend on the date in ways which cannot be looked up once. The
+    formats containing them are formatted by switching the process to the
+    locale for the call.
+
+    :param locale_name: the locale, e.g. ``'fr_FR.UTF-8'``
+    """
+
+    def __init__(self, locale_name):
+        self.locale = locale_name
+        self.names = {}
+        self.formats = {}
+
+        old_locale = locale.setlocale(locale.LC_ALL)
+        try:
+            locale.setlocale(locale.LC_ALL, str(locale_name))
+            # 2012-01-02 is a monday
+            days = [datetime(2012, 1, day) for day in range(2, 9)]
+            months = [datetime(2012, month, 1) for month in range(1, 13)]
+            hours = [datetime(2012, 1, 1, 1), datetime(2012, 1, 1, 13)]
+            for directive, dates in (('a', days), ('A', days), ('b', months),
+                                     ('B', months), ('p', hours)):
+                self.names[directive] = [
+                    strftime(date, '%' + directive).replace('%', '%%')
+                    for date in dates]
+            nl_langinfo = getattr(locale, 'nl_langinfo', None)
+            if nl_langinfo is not None:  # not available on Windows
+                for directive, item in (('c', locale.D_T_FMT),
+                                        ('x', locale.D_FMT),
+                                        ('X', locale.T_FMT)):
+                    self.formats[directive] = nl_langinfo(item)
+        finally:
+            locale.setlocale(locale.LC_ALL, old_locale)
+
+    def __call__(self, date, date_format):
+        if any(match.group(1) != '%'
+               for match in _LOCALE_MODIFIER_RE.finditer(date_format)):
+            return self._strftime_in_locale(date, date_format)
+
+        def expand_format(match):
+            return self.formats.get(match.group(1), match.group(0))
+
+        def replace_name(match):
+            directive = match.group(1)
+            if directive == '%':
+                return '%%'
+            elif directive in 'aA':
+                index = date.weekday()
+            elif directive in 'bB':
+                index = date.month - 1
+            else:
+                index = 0 if date.hour < 12 else 1
+            return self.names[directive][index]
+
+        date_format = _LOCALE_FORMAT_RE.sub(expand_format, date_format)
+        date_format = _LOCALE_DIRECTIVE_RE.sub(replace_name, date_format)
+        return strftime(date, date_format)
+
+    def _strftime_in_locale(self, date, date_format):
+        old_locale = locale.setlocale(locale.LC_ALL)
+        try:
+            locale.setlocale(locale.LC_ALL, str(self.locale))
+            return strftime(date, date_format)
+        finally:
+            locale.setlocale(locale.LC_ALL, old_locale)
+
+
+@memoized
+def get_date_formatter(locale_name):
+    """Return the :class:`DateFormatter` of ``locale_name``."""
+    return DateFormatter(locale_name)
+
+
+class LayeredContext(Mapping):
+    """Read-only view over several mappings, looked up in order.
+
+    It holds the context of the templates: the variables of an output are
+    laid over the context shared by all the outputs, which therefore does not
+    need to be copied for each of them until the output is rendered.
+    """
+
+    def __init__(self, *maps):
+        self.maps = []
+        for mapping in maps:
+            # nested contexts are flattened to keep the lookups short
+            if isinstance(mapping, LayeredContext):
+                self.maps.extend(mapping.maps)
+            else:
+                self.maps.append(mapping)
+
+    def new_child(self, mapping=None):
+        """Return a new context with ``mapping`` laid over this one."""
+        return self.__class__(mapping if mapping is not None else {},
+                              *self.maps)
+
+    def flatten(self):
+        """Return a dict of all the variables of the context."""
+        flat = {}
+        for mapping in reversed(self.maps):
+            flat.update(mapping)
+        return flat
+
+    def __getitem__(self, key):
+        for mapping in self.maps:
+            if key in mapping:
+                return mapping[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return any(key in mapping for mapping in self.maps)
+
+    def __iter__(self):
+        return iter(set().union(*self.maps))
+
+    def __len__(self):
+        return len(set().union(*self.maps))
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join(repr(m) for m in self.maps))
+
+
+_DATE_FORMATS = ('%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M',
+                 '%Y-%m-%d', '%Y/%m/%d',
+                 '%d-%m-%Y', '%Y-%d-%m',  # Weird ones
+                 '%d/%m/%Y', '%d.%m.%Y',
+                 '%d.%m.%Y %H:%M', '%Y-%m-%d %H:%M:%S')
+
+# the dates in the %Y-%m-%d formats, parsed without strptime
+_ISO_DATE_RE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})'
+                          r'(?: ([0-9]{2}):([0-9]{2})(?::([0-9]{2}))?)?\Z')
+
+# the formats tried by get_date, the one of the last date parsed first
+_date_formats = _DATE_FORMATS
+
+
 def get_date(string):
     """Return a datetime object from a string.
 
     If no format matches the given date, raise a ValueError.
     """
-    string = re.sub(' +', ' ', string)
-    formats = ['%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M',
-               '%Y-%m-%d', '%Y/%m/%d',
-               '%d-%m-%Y', '%Y-%d-%m',  # Weird ones
-               '%d/%m/%Y', '%d.%m.%Y',
-               '%d.%m.%Y %H:%M', '%Y-%m-%d %H:%M:%S']
-    for date_format in formats:
+    global _date_formats
+    if '  ' in string:
+        string = re.sub(' +', ' ', string)
+
+    match = _ISO_DATE_RE.match(string)
+    if match:
         try:
-            return datetime.strptime(string, date_format)
+            return datetime(*[int(value) for value in match.groups()
+                              if value is not None])
         except ValueError:
-            pass
+            pass  # it can still match %Y-%d-%m
+
+    for date_format in _date_formats:
+        try:
+            date = datetime.strptime(string, date_format)
+        except ValueError:
+            continue
+        # the dates of a site usually have the same format. %Y-%d-%m is
+        # never tried first, as it would take precedence over %Y-%m-%d
+        if date_format != _date_formats[0] and date_format != '%Y-%d-%m':
+            _date_formats = (date_format,) + tuple(
+                f for f in _DATE_FORMATS if f != date_format)
+        return date
     raise ValueError("'%s' is not a valid date" % string)
 
 
@@ -146,34 +314,63 @@ def pelican_open(filename):
     return open(filename, encoding='utf-8').read()
 
 
+# the values slugify can handle without stripping tags, unescaping entities
+# and transliterating: printable ASCII characters without "<" and "&"
+_SLUGIFY_SLOW_RE = re.compile(r'[^\t\n\r\f\v\x20-\x7e]|[<&]')
+_SLUGIFY_STRIP_RE = re.compile(r'[^\w\s-]')
+_SLUGIFY_HYPHENATE_RE = re.compile(r'[-\s]+')
+
+# the slugs computed recently and before them, see slugify
+_SLUG_CACHE_SIZE = 4096
+_slugs = [{}, {}]
+
+
 def slugify(value):
     """
     Normalizes string, converts to lowercase, removes non-alpha characters,
     and converts spaces to hyphens.
 
     Took from django sources.
+
+    The slugs are cached. When the cache of the recent slugs is full, it
+    replaces the cache of the previous ones, so the slugs which are not used
+    anymore are eventually forgotten.
     """
+    value = six.text_type(value)
+    recent, previous = _slugs
+    slug = recent.get(value)
+    if slug is None:
+        slug = previous.get(value)
+        if slug is None:
+            slug = _slugify(value)
+        if len(recent) >= _SLUG_CACHE_SIZE:
+            recent = {}
+            _slugs[:] = recent, _slugs[0]
+        recent[value] = slug
+    return slug
+
+
+def _slugify(value):
     # TODO Maybe steal again from current Django 1.5dev
-    value = Markup(value).striptags()
-    # value must be unicode per se
-    import unicodedata
-    from unidecode import unidecode
-    # unidecode returns str in Py2 and 3, so in Py2 we have to make
-    # it unicode again
-    value = unidecode(value)
-    if isinstance(value, six.binary_type):
-        value = value.decode('ascii')
-    # still unicode
-    value = unicodedata.normalize('NFKD', value)
-    value = re.sub('[^\w\s-]', '', value).strip().lower()
-    value = re.sub('[-\s]+', '-', value)
+    if _SLUGIFY_SLOW_RE.search(value):
+        value = Markup(value).striptags()
+        # unidecode returns str in Py2 and 3, so in Py2 we have to make
+        # it unicode again
+        value = unidecode(value)
+        if isinstance(value, six.binary_type):
+            value = value.decode('ascii')
+        # still unicode
+        value = unicodedata.normalize('NFKD', value)
+    value = _SLUGIFY_STRIP_RE.sub('', value).strip().lower()
+    value = _SLUGIFY_HYPHENATE_RE.sub('-', value)
     # we want only ASCII chars
     value = value.encode('ascii', 'ignore')
     # but Pelican should generally use only unicode
     return value.decode('ascii')
 
 
-def copy(path, source, destination, destination_path=None, overwrite=False):
+def copy(path, source, destination, destination_path=None, overwrite=False,
+         mode='copy'):
     """Copy path from origin to destination.
 
     The function is able to copy either files or directories.
@@ -183,7 +380,9 @@ def copy(path, source, destination, destination_path=None, overwrite=False):
     :param destination: the destination dir
     :param destination_path: the destination path (optional)
     :param overwrite: whether to overwrite the destination if already exists
-                      or not
+                      or not. An existing directory is synchronized with the
+                      source, see :func:`sync_tree`.
+    :param mode: how the files are copied, see :func:`copy_file`
     """
     if not destination_path:
         destination_path = path
@@ -193,15 +392,17 @@ def copy(path, source, destination, destination_path=None, overwrite=False):
         os.path.expanduser(os.path.join(destination, destination_path)))
 
     if os.path.isdir(source_):
+        if overwrite:
+            copied, removed = sync_tree([source_], destination_, mode)
+            if copied or removed:
+                logger.info('synchronized %s with %s (%d copied, %d removed)'
+                            % (destination_, source_, copied, removed))
+            return
         try:
             shutil.copytree(source_, destination_)
             logger.info('copying %s to %s' % (source_, destination_))
         except OSError:
-            if overwrite:
-                shutil.rmtree(destination_)
-                shutil.copytree(source_, destination_)
-                logger.info('replacement of %s with %s' % (source_,
-                    destination_))
+            pass
 
     elif os.path.isfile(source_):
         dest_dir = os.path.dirname(destination_)
@@ -212,6 +413,154 @@ def copy(path, source, destination, destination_path=None, overwrite=False):
     else:
         logger.warning('skipped copy %s to %s' % (source_, destination_))
 
+def is_up_to_date(source, destination):
+    """Return whether ``destination`` is a copy of the ``source`` file.
+
+    The files are compared by size and modification time. When only the times
+    differ, the contents are compared, and the time of the source is given to
+    the destination if they are the same, so that the next check is cheap.
+    """
+    try:
+        dest_stat = os.stat(destination)
+    except OSError:
+        return False
+    src_stat = os.stat(source)
+    if src_stat.st_size != dest_stat.st_size:
+        return False
+    if (src_stat.st_dev, src_stat.st_ino) == (dest_stat.st_dev,
+                                              dest_stat.st_ino):
+        return True  # hard link
+    if src_stat.st_mtime == dest_stat.st_mtime:
+        return True
+    if filecmp.cmp(source, destination, shallow=False):
+        shutil.copystat(source, destination)
+        return True
+    return False
+
+
+def _copy_file_range(source, destination):
+    """Copy a file with copy_file_range(), which lets file systems such as
+    Btrfs or XFS share the data blocks of the two files."""
+    with io.open(source, 'rb') as fsrc:
+        with io.open(destination, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                            remaining)
+                if not copied:
+                    break
+                remaining -= copied
+    shutil.copystat(source, destination)
+
+
+def copy_file(source, destination, mode='copy'):
+    """Copy the ``source`` file to ``destination`` unless it is up to date.
+
+    Return whether the file has been copied.
+
+    :param mode: ``'copy'`` to copy the file, ``'hardlink'`` to create a hard
+        link to the source, or ``'reflink'`` to let the file system share
+        the data of the two files. The file is copied when the link cannot be
+        created, e.g. when the source and the destination are not on the same
+        file system.
+    """
+    if is_up_to_date(source, destination):
+        return False
+    dest_dir = os.path.dirname(destination)
+    if dest_dir:
+        mkdir_p(dest_dir)
+    # never write through a hard link created by a previous build
+    try:
+        os.remove(destination)
+    except OSError:
+        pass
+
+    if mode == 'hardlink':
+        try:
+            os.link(source, destination)
+            return True
+        except (AttributeError, OSError) as e:
+            logger.debug('Unable to link %s: %s' % (destination, e))
+    elif mode == 'reflink' and hasattr(os, 'copy_file_range'):
+        try:
+            _copy_file_range(source, destination)
+            return True
+        except OSError as e:
+            logger.debug('Unable to reflink %s: %s' % (destination, e))
+    shutil.copy2(source, destination)
+    return True
+
+
+def list_tree(sources, destination):
+    """Return a dict mapping the files of the ``destination`` directory to
+    the ``sources`` files and directories they are copies of, the last
+    sources taking precedence.
+    """
+    if isinstance(sources, six.string_types):
+        sources = [sources]
+    files = {}
+    for source in sources:
+        if os.path.isfile(source):
+            dest = os.path.join(destination, os.path.basename(source))
+            files[os.path.normpath(dest)] = source
+        elif not os.path.isdir(source):
+            logger.warning('skipped copy %s to %s' % (source, destination))
+        for root, dirs, names in os.walk(source, followlinks=True):
+            dest_root = os.path.join(destination,
+                                     os.path.relpath(root, source))
+            for name in names:
+                dest = os.path.normpath(os.path.join(dest_root, name))
+                files[dest] = os.path.join(root, name)
+    return files
+
+
+def sync_tree(sources, destination, mode='copy'):
+    """Make the ``destination`` directory a copy of the ``sources`` files and
+    directories, the last ones taking precedence.
+
+    Only the new and modified files are copied, and the other files of
+    ``destination`` are removed. Return the numbers of copied and removed
+    files.
+    """
+    files = list_tree(sources, destination)
+    copied = 0
+    for dest in sorted(files):
+        if copy_file(files[dest], dest, mode):
+            copied += 1
+    stale = []
+    for root, dirs, names in os.walk(destination):
+        for name in names:
+            path = os.path.normpath(os.path.join(root, name))
+            if path not in files:
+                stale.append(path)
+    return copied, len(remove_stale_files(stale, destination))
+
+
+def remove_stale_files(paths, directory):
+    """Remove the ``paths`` files, then the directories left empty up to
+    ``directory``, and return the paths of the removed files.
+
+    Only the files listed in ``paths`` are removed, so the files created in
+    the same directories by other means, such as plugins, are kept.
+    """
+    removed = []
+    for path in sorted(paths):
+        try:
+            os.remove(path)
+            removed.append(path)
+            logger.debug('removed stale file %s' % path)
+        except OSError:
+            pass
+
+    directory = os.path.normpath(directory)
+    for path in sorted(set(os.path.dirname(p) for p in removed), reverse=True):
+        while path.startswith(directory + os.sep) and os.path.isdir(path) \
+                and not os.listdir(path):
+            os.rmdir(path)
+            path = os.path.dirname(path)
+    return removed
+
+
 def clean_output_dir(path):
     """Remove all the files from the output directory"""
 
@@ -254,6 +603,12 @@ def get_relative_path(filename):
         return '/'.join(['..'] * nslashes)
 
 
+_HTML4_SINGLETS = set(('br', 'col', 'link', 'base', 'img', 'param', 'area',
+                       'hr', 'input'))
+_WORDS_RE = re.compile(r'&.*?;|<.*?>|(\w[\w-]*)', re.U)
+_TAG_RE = re.compile(r'<(/)?([^ ]+?)(?: (/)| .*?)?>')
+
+
 def truncate_html_words(s, num, end_text='...'):
     """Truncates HTML to a certain number of words (not counting tags and
     comments). Closes opened tags if they were correctly closed in the given
@@ -266,62 +621,51 @@ def truncate_html_words(s, num, end_text='...'):
     length = int(num)
     if length <= 0:
         return ''
-    html4_singlets = ('br', 'col', 'link', 'base', 'img', 'param', 'area',
-                      'hr', 'input')
-
-    # Set up regular expressions
-    re_words = re.compile(r'&.*?;|<.*?>|(\w[\w-]*)', re.U)
-    re_tag = re.compile(r'<(/)?([^ ]+?)(?: (/)| .*?)?>')
-    # Count non-HTML words and keep note of open tags
-    pos = 0
+
+    # Count non-HTML words and keep note of open tags, in a single pass over
+    # the string
     end_text_pos = 0
     words = 0
-    open_tags = []
-    while words <= length:
-        m = re_words.search(s, pos)
-        if not m:
-            # Checked through whole string
-            break
-        pos = m.end(0)
+    open_tags = []  # the most recently opened last
+    for m in _WORDS_RE.finditer(s):
         if m.group(1):
             # It's an actual non-HTML word
             words += 1
             if words == length:
-                end_text_pos = pos
+                end_text_pos = m.end(0)
+            elif words > length:
+                break
+            continue
+        if end_text_pos:
+            # Don't worry about tags after our truncate point
             continue
         # Check for tag
-        tag = re_tag.match(m.group(0))
-        if not tag or end_text_pos:
-            # Don't worry about non tags or tags after our truncate point
+        tag = _TAG_RE.match(m.group(0))
+        if not tag:
             continue
         closing_tag, tagname, self_closing = tag.groups()
         tagname = tagname.lower()  # Element names are always case-insensitive
-        if self_closing or tagname in html4_singlets:
+        if self_closing or tagname in _HTML4_SINGLETS:
             pass
         elif closing_tag:
-            # Check for match in open tags list
-            try:
-                i = open_tags.index(tagname)
-            except ValueError:
-                pass
-            else:
-                # SGML: An end tag closes, back to the matching start tag,
-                # all unclosed intervening start tags with omitted end tags
-                open_tags = open_tags[i + 1:]
+            # SGML: An end tag closes, back to the matching start tag,
+            # all unclosed intervening start tags with omitted end tags
+            for i in range(len(open_tags) - 1, -1, -1):
+                if open_tags[i] == tagname:
+                    del open_tags[i:]
+                    break
         else:
-            # Add it to the start of the open tags list
-            open_tags.insert(0, tagname)
+            open_tags.append(tagname)
     if words <= length:
         # Don't try to close tags if we don't need to truncate
         return s
-    out = s[:end_text_pos]
+    out = [s[:end_text_pos]]
     if end_text:
-        out += ' ' + end_text
+        out.append(' ' + end_text)
     # Close any tags still open
-    for tag in open_tags:
-        out += '</%s>' % tag
-    # Return string
-    return out
+    for tag in reversed(open_tags):
+        out.append('</%s>' % tag)
+    return ''.join(out)
 
 
 def process_translations(content_list):
@@ -385,6 +729,17 @@ def files_changed(path, extensions):
     return False
 
 
+def has_files(path, extensions):
+    """Return True if ``path`` contains files ending with one of the
+    ``extensions``, outside of the hidden directories"""
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [x for x in dirs if x[0] != '.']
+        for f in files:
+            if any(f.endswith(ext) for ext in extensions):
+                return True
+    return False
+
+
 FILENAMES_MTIMES = defaultdict(int)
 
 
@@ -400,13 +755,18 @@ def file_changed(filename):
         return False
 
 
+@memoized
+def _get_timezone(tz_name):
+    return pytz.timezone(tz_name)
+
+
 def set_date_tzinfo(d, tz_name=None):
     """ Date without tzinfo shoudbe utc.
     This function set the right tz to date that aren't utc and don't have
     tzinfo.
     """
     if tz_name is not None:
-        tz = pytz.timezone(tz_name)
+        tz = _get_timezone(tz_name)
         return tz.localize(d)
     else:
         return d
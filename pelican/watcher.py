@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import os
+import time
+import logging
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None  # NOQA
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir  # NOQA
+    except ImportError:
+        scandir = None  # NOQA
+
+logger = logging.getLogger(__name__)
+
+
+def _is_ignored(path, ignore):
+    return any(path == p or path.startswith(p + os.sep) for p in ignore)
+
+
+class PollingBackend(object):
+    """Detect the changes by comparing snapshots of the modification times
+    and sizes of the watched files."""
+
+    def __init__(self, paths, ignore=(), interval=.5):
+        self.paths = paths
+        self.ignore = ignore
+        self.interval = interval
+        self._snapshot = self.snapshot()
+
+    def _scan(self, path):
+        if scandir is None:
+            for root, dirs, files in os.walk(path, followlinks=True):
+                dirs[:] = [d for d in dirs if d[0] != '.' and
+                           not _is_ignored(os.path.join(root, d), self.ignore)]
+                for f in files:
+                    if f[0] == '.':
+                        continue
+                    filename = os.path.join(root, f)
+                    try:
+                        stat = os.stat(filename)
+                    except OSError:
+                        continue
+                    yield filename, (stat.st_mtime, stat.st_size)
+            return
+
+        directories = [path]
+        while directories:
+            try:
+                entries = list(scandir(directories.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name[0] == '.':
+                    continue
+                try:
+                    if entry.is_dir():
+                        if not _is_ignored(entry.path, self.ignore):
+                            directories.append(entry.path)
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, (stat.st_mtime, stat.st_size)
+
+    def snapshot(self):
+        snapshot = {}
+        for path in self.paths:
+            if os.path.isdir(path):
+                snapshot.update(self._scan(path))
+            elif os.path.exists(path):
+                stat = os.stat(path)
+                snapshot[path] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+    def poll(self, timeout):
+        """Return the paths changed within ``timeout`` seconds."""
+        time.sleep(min(timeout, self.interval))
+        previous, self._snapshot = self._snapshot, self.snapshot()
+        changed = set(path for path, stat in self._snapshot.items()
+                      if previous.get(path) != stat)
+        changed.update(set(previous) - set(self._snapshot))
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyBackend(object):
+    """Receive the changes from the kernel with inotify (Linux only)."""
+
+    def __init__(self, paths, ignore=()):
+        self.ignore = ignore
+        self._changed = set()
+        self._manager = pyinotify.WatchManager()
+        self._notifier = pyinotify.Notifier(self._manager,
+                                            default_proc_fun=self._process)
+        mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE |
+                pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM |
+                pyinotify.IN_MOVED_TO | pyinotify.IN_ATTRIB)
+        for path in paths:
+            if os.path.exists(path):
+                self._manager.add_watch(path, mask, rec=True, auto_add=True,
+                        exclude_filter=lambda p: _is_ignored(p, self.ignore))
+
+    def _process(self, event):
+        if event.dir or os.path.basename(event.pathname).startswith('.'):
+            return
+        if not _is_ignored(event.pathname, self.ignore):
+            self._changed.add(event.pathname)
+
+    def poll(self, timeout):
+        """Return the paths changed within ``timeout`` seconds."""
+        if self._notifier.check_events(int(timeout * 1000)):
+            self._notifier.read_events()
+            self._notifier.process_events()
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def close(self):
+        self._notifier.stop()
+
+
+class Watcher(object):
+    """Watch files and directories for changes.
+
+    Changes are received from inotify when pyinotify is available, otherwise
+    the watched trees are scanned periodically. Hidden files and directories,
+    as well as the ``ignore`` paths, are not watched.
+
+    :param paths: the files and directories to watch
+    :param ignore: the directories to leave out, e.g. the output directory
+    :param debounce: the time, in seconds, to wait for the end of a burst of
+        changes before reporting them
+    """
+
+    def __init__(self, paths, ignore=(), debounce=.2, backend=None):
+        paths = [os.path.abspath(path) for path in paths]
+        ignore = [os.path.abspath(path) for path in ignore]
+        if backend is None:
+            backend = InotifyBackend if pyinotify is not None \
+                    else PollingBackend
+        logger.debug('Watching %s with %s' % (', '.join(paths),
+                                             backend.__name__))
+        self.backend = backend(paths, ignore)
+        self.debounce = debounce
+
+    def wait(self, timeout=None):
+        """Block until some files change and return the set of their paths.
+
+        Return an empty set if nothing changed within ``timeout`` seconds.
+        """
+        start = time.time()
+        changed = set()
+        while not changed:
+            if timeout is not None:
+                remaining = start + timeout - time.time()
+                if remaining <= 0:
+                    return changed
+                changed = self.backend.poll(remaining)
+            else:
+                changed = self.backend.poll(1)
+
+        # wait for the burst of changes to end, e.g. when an editor writes
+        # a backup file or a whole directory is copied
+        while True:
+            more = self.backend.poll(self.debounce)
+            if not more:
+                return changed
+            changed.update(more)
+
+    def close(self):
+        self.backend.close()
@@ -2,19 +2,57 @@
 from __future__ import with_statement, unicode_literals, print_function
 import six
 
+import io
 import os
-import locale
 import logging
+import multiprocessing
 
 from codecs import open
+from itertools import islice
 from feedgenerator import Atom1Feed, Rss201rev2Feed
 from jinja2 import Markup
+from pelican import profiler
 from pelican.paginator import Paginator
-from pelican.utils import get_relative_path, set_date_tzinfo
+from pelican.utils import get_relative_path, set_date_tzinfo, LayeredContext
 
 
 logger = logging.getLogger(__name__)
 
+# the writer and the jobs rendered by the worker processes, inherited when
+# the processes are forked
+_deferred = None
+
+# the number of chunks of the templates rendered with STREAM_OUTPUT joined
+# before being written
+_STREAM_CHUNKS = 256
+
+
+def _replace(source, destination):
+    """Rename ``source`` to ``destination``, replacing it if it exists."""
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        # os.rename only replaces the existing files on POSIX systems
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def _encode_chunks(chunks):
+    """Join the chunks of a rendered template by groups and encode them."""
+    while True:
+        group = list(islice(chunks, _STREAM_CHUNKS))
+        if not group:
+            return
+        yield ''.join(group).encode('utf-8')
+
+
+def _render_deferred(index):
+    writer, jobs = _deferred
+    start = profiler.clock()
+    written = writer._render_job(jobs[index])
+    return written, profiler.elapsed(start)
+
 
 class Writer(object):
 
@@ -22,6 +60,13 @@ class Writer(object):
         self.output_path = output_path
         self.reminder = dict()
         self.settings = settings or {}
+        self.dependencies = None
+        self._deferred = None
+        # number of files written and left untouched during this build
+        self.written = 0
+        self.unchanged = 0
+        # feed entries, by content object and site url
+        self._feed_items = {}
 
     def _create_new_feed(self, feed_type, context):
         feed_class = Rss201rev2Feed if feed_type == 'rss' else Atom1Feed
@@ -34,73 +79,215 @@ class Writer(object):
         return feed
 
     def _add_item_to_the_feed(self, feed, item):
-        title = Markup(item.title).striptags()
-        feed.add_item(
-            title=title,
-            link='%s/%s' % (self.site_url, item.url),
-            unique_id='tag:%s,%s:%s' % (self.site_url.replace('http://', ''),
-                                        item.date.date(), item.url),
-            description=item.get_content(self.site_url, content_type='FEED'),
-            categories=item.tags if hasattr(item, 'tags') else None,
-            author_name=getattr(item, 'author', ''),
-            pubdate=set_date_tzinfo(item.date,
-                self.settings.get('TIMEZONE', None)))
+        # an article appears in many feeds (all, category, tags, etc.), only
+        # compute its entry once
+        key = (item, self.site_url)
+        entry = self._feed_items.get(key)
+        if entry is None:
+            entry = self._feed_items[key] = dict(
+                title=Markup(item.title).striptags(),
+                link='%s/%s' % (self.site_url, item.url),
+                unique_id='tag:%s,%s:%s' % (
+                    self.site_url.replace('http://', ''),
+                    item.date.date(), item.url),
+                description=item.get_content(self.site_url,
+                                             content_type='FEED'),
+                categories=item.tags if hasattr(item, 'tags') else None,
+                author_name=getattr(item, 'author', ''),
+                pubdate=set_date_tzinfo(item.date,
+                    self.settings.get('TIMEZONE', None)))
+        feed.add_item(**entry)
 
     def write_feed(self, elements, context, filename=None, feed_type='atom'):
         """Generate a feed with the list of articles provided
 
         Return the feed. If no output_path or filename is specified, just
-        return the feed object.
+        return the feed object. If the feed file is up to date, nothing is
+        added to the returned feed.
 
         :param elements: the articles to put on the feed.
         :param context: the context to get the feed metadata.
         :param filename: the filename to output.
         :param feed_type: the feed type to use (atom or rss)
         """
-        old_locale = locale.setlocale(locale.LC_ALL)
-        locale.setlocale(locale.LC_ALL, str('C'))
-        try:
-            self.site_url = context.get('SITEURL', get_relative_path(filename))
-            self.feed_domain = context.get('FEED_DOMAIN')
-            self.feed_url = '%s/%s' % (self.feed_domain, filename)
-
-            feed = self._create_new_feed(feed_type, context)
-
-            max_items = len(elements)
-            if self.settings['FEED_MAX_ITEMS']:
-                max_items = min(self.settings['FEED_MAX_ITEMS'], max_items)
-            for i in range(max_items):
-                self._add_item_to_the_feed(feed, elements[i])
-
-            if filename:
-                complete_path = os.path.join(self.output_path, filename)
-                try:
-                    os.makedirs(os.path.dirname(complete_path))
-                except Exception:
-                    pass
-                fp = open(complete_path, 'w', encoding='utf-8' if six.PY3 else None)
-                feed.write(fp, 'utf-8')
-                logger.info('writing %s' % complete_path)
-
-                fp.close()
-            return feed
-        finally:
-            locale.setlocale(locale.LC_ALL, old_locale)
-
-    def write_file(self, template, localcontext, output_path, name):
-        """Render the template write the file."""
-        localcontext['output_file'] = name
-        old_locale = locale.setlocale(locale.LC_ALL)
-        locale.setlocale(locale.LC_ALL, str('C'))
+        with profiler.measure('feed', filename or feed_type):
+            return self._write_feed(elements, context, filename, feed_type)
+
+    def _write_feed(self, elements, context, filename, feed_type):
+        self.site_url = context.get('SITEURL', get_relative_path(filename))
+        self.feed_domain = context.get('FEED_DOMAIN')
+        self.feed_url = '%s/%s' % (self.feed_domain, filename)
+
+        feed = self._create_new_feed(feed_type, context)
+
+        max_items = len(elements)
+        if self.settings['FEED_MAX_ITEMS']:
+            max_items = min(self.settings['FEED_MAX_ITEMS'], max_items)
+
+        if filename and self.dependencies is not None:
+            complete_path = os.path.join(self.output_path, filename)
+            signature = self.dependencies.feed_signature(
+                filename, feed_type, elements[:max_items], context)
+            if not self.dependencies.update(filename, signature) and \
+                    os.path.exists(complete_path):
+                logger.debug('%s is up to date' % complete_path)
+                return feed
+
+        for i in range(max_items):
+            self._add_item_to_the_feed(feed, elements[i])
+
+        if filename:
+            complete_path = os.path.join(self.output_path, filename)
+            output = feed.writeString('utf-8')
+            if not isinstance(output, six.binary_type):
+                output = output.encode('utf-8')
+            self._write(complete_path, output)
+        return feed
+
+    def write_file(self, template, localcontext, output_path, name,
+            context=None):
+        """Render the template write the file.
+
+        :param context: the shared context, whose ``localsiteurl`` is used by
+            the content objects to render their links
+        """
+        localcontext = LayeredContext({'output_file': name}, localcontext)
+        siteurl = context.get('localsiteurl') if context is not None else None
+        if self.dependencies is not None:
+            signature = self.dependencies.file_signature(name, template,
+                    localcontext, context, siteurl)
+            filename = os.sep.join((output_path, name))
+            if not self.dependencies.update(name, signature) and \
+                    os.path.exists(filename):
+                logger.debug('%s is up to date' % filename)
+                return
+        job = (template, localcontext, output_path, name, context, siteurl)
+        if self._deferred is not None:
+            self._deferred.append(job)
+        else:
+            self._render_job(job)
+
+    def defer(self):
+        """Queue the files passed to :meth:`write_file` instead of rendering
+        them right away, until :meth:`flush` is called."""
+        self._deferred = []
+
+    def flush(self, workers=1):
+        """Render and write the queued files, spreading them across
+        ``workers`` processes.
+
+        The processes are forked, so each of them shares the templates and a
+        snapshot of the context with the main process.
+        """
+        global _deferred
+        jobs, self._deferred = self._deferred or [], None
+        if workers > 1 and len(jobs) > 1 and hasattr(os, 'fork'):
+            if hasattr(multiprocessing, 'get_context'):
+                mp = multiprocessing.get_context('fork')
+            else:
+                mp = multiprocessing
+            _deferred = (self, jobs)
+            pool = mp.Pool(min(workers, len(jobs)))
+            try:
+                results = pool.map(_render_deferred, range(len(jobs)),
+                                   max(1, len(jobs) // (workers * 4)))
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+                _deferred = None
+            # the counters and the timings of the workers are lost with them
+            for job, (written, times) in zip(jobs, results):
+                if written:
+                    self.written += 1
+                else:
+                    self.unchanged += 1
+                profiler.record('render', job[3], times)
+        else:
+            for job in jobs:
+                self._render_job(job)
+
+    def _render_job(self, job):
+        template, localcontext, output_path, name, context, siteurl = job
+        with profiler.measure('render', name):
+            if context is not None:
+                context['localsiteurl'] = siteurl
+            filename = os.sep.join((output_path, name))
+            # jinja looks the variables up faster in a flat dict
+            if self.settings.get('STREAM_OUTPUT'):
+                chunks = template.generate(localcontext.flatten())
+                return self._write_stream(filename, _encode_chunks(chunks))
+            output = template.render(localcontext.flatten())
+            return self._write(filename, output.encode('utf-8'))
+
+    def _write(self, filename, output):
+        """Write ``output``, an encoded string, to ``filename``.
+
+        If the file already holds this exact output, it is left untouched so
+        that its modification time is preserved. Return whether the file has
+        been written.
+        """
         try:
-            output = template.render(localcontext)
-        finally:
-            locale.setlocale(locale.LC_ALL, old_locale)
-        filename = os.sep.join((output_path, name))
+            if os.path.getsize(filename) == len(output):
+                with open(filename, 'rb') as f:
+                    if f.read() == output:
+                        logger.debug('%s is unchanged' % filename)
+                        self.unchanged += 1
+                        return False
+        except (IOError, OSError):
+            pass
         try:
             os.makedirs(os.path.dirname(filename))
         except Exception:
             pass
-        with open(filename, 'w', encoding='utf-8') as f:
+        with open(filename, 'wb') as f:
             f.write(output)
         logger.info('writing %s' % filename)
+        self.written += 1
+        return True
+
+    def _write_stream(self, filename, chunks):
+        """Write ``chunks``, encoded strings, to ``filename`` as they come.
+
+        They are written to a temporary file, which then replaces
+        ``filename``, so the file is never left half written. Like with
+        :meth:`_write`, a file which already holds this exact output is left
+        untouched. Return whether the file has been written.
+        """
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except Exception:
+            pass
+        temp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            previous = io.open(filename, 'rb')
+        except (IOError, OSError):
+            previous = None
+        try:
+            with io.open(temp_filename, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    # compare with the previous output until they differ
+                    if previous is not None and \
+                            previous.read(len(chunk)) != chunk:
+                        previous.close()
+                        previous = None
+            unchanged = previous is not None and not previous.read(1)
+            if previous is not None:
+                previous.close()
+                previous = None
+            if unchanged:
+                os.remove(temp_filename)
+                logger.debug('%s is unchanged' % filename)
+                self.unchanged += 1
+                return False
+            _replace(temp_filename, filename)
+        except BaseException:
+            if previous is not None:
+                previous.close()
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+        logger.info('writing %s' % filename)
+        self.written += 1
+        return True
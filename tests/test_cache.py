@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import os
+import time
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from jinja2 import Environment, DictLoader
+from mock import patch
+
+from pelican import cache, readers
+from pelican.cache import ReaderCache, DependencyGraph
+from pelican.contents import Article, Tag
+from .support import unittest, get_settings
+
+CUR_DIR = os.path.dirname(__file__)
+CONTENT_PATH = os.path.join(CUR_DIR, 'content')
+
+
+class TestReaderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_path = mkdtemp()
+        self.settings = {'CACHE_CONTENT': True, 'CACHE_PATH': self.cache_path}
+
+    def tearDown(self):
+        rmtree(self.cache_path)
+
+    def test_read_file_uses_cache(self):
+        filename = os.path.join(CONTENT_PATH, 'article_with_metadata.rst')
+        content, metadata = readers.read_file(filename,
+                                              settings=self.settings)
+
+        with patch.object(readers.RstReader, 'read') as read:
+            cached_content, cached_metadata = readers.read_file(filename,
+                    settings=self.settings)
+            self.assertFalse(read.called)
+
+        self.assertEqual(content, cached_content)
+        self.assertEqual(metadata['title'], cached_metadata['title'])
+        self.assertEqual(metadata['date'], cached_metadata['date'])
+        # the URL wrappers are bound to the current settings again
+        for tag in cached_metadata['tags']:
+            self.assertIs(tag.settings, self.settings)
+
+    def test_settings_invalidate_cache(self):
+        filename = os.path.join(CONTENT_PATH, 'article_with_metadata.rst')
+        readers.read_file(filename, settings=self.settings)
+
+        settings = dict(self.settings, TYPOGRIFY=False)
+        with patch.object(readers.RstReader, 'read') as read:
+            read.return_value = ('content', {'title': 'title'})
+            readers.read_file(filename, settings=settings)
+            self.assertTrue(read.called)
+
+    def test_included_files_invalidate_cache(self):
+        source_path = mkdtemp()
+        try:
+            filename = os.path.join(source_path, 'article.rst')
+            included = os.path.join(source_path, 'included.txt')
+            with open(filename, 'w') as f:
+                f.write('Title\n#####\n\n.. include:: included.txt\n')
+            with open(included, 'w') as f:
+                f.write('first version')
+            content, _ = readers.read_file(filename, settings=self.settings)
+            self.assertIn('first version', content)
+
+            with patch.object(readers.RstReader, 'read') as read:
+                readers.read_file(filename, settings=self.settings)
+                self.assertFalse(read.called)
+
+            with open(included, 'w') as f:
+                f.write('second version')
+            content, _ = readers.read_file(filename, settings=self.settings)
+            self.assertIn('second version', content)
+        finally:
+            rmtree(source_path)
+
+    def test_library_versions_invalidate_cache(self):
+        filename = os.path.join(CONTENT_PATH, 'article_with_metadata.rst')
+        reader = readers.RstReader(self.settings)
+        key = ReaderCache(self.cache_path).get_key(filename, reader,
+                                                   self.settings)
+        with patch.object(cache, '_library_versions', 'docutils=0'):
+            self.assertNotEqual(ReaderCache(self.cache_path).get_key(
+                filename, reader, self.settings), key)
+
+    def test_eviction(self):
+        cache = ReaderCache(self.cache_path, max_size=3000)
+        for i in range(10):
+            cache.set('entry%d' % i, ('x' * 1000, {}))
+        self.assertLessEqual(
+            sum(os.path.getsize(os.path.join(self.cache_path, name))
+                for name in os.listdir(self.cache_path)), 3000)
+        # the last written entry is never evicted
+        self.assertEqual(cache.get('entry9'), ('x' * 1000, {}))
+
+    def test_size_of_replaced_entries(self):
+        cache = ReaderCache(self.cache_path, max_size=3000)
+        for i in range(10):
+            cache.set('entry', ('x' * 1000, {}))
+        # the entry replaces itself, nothing is evicted
+        self.assertEqual(cache._size, os.path.getsize(
+            os.path.join(self.cache_path, 'entry')))
+        cache.set('other', ('x' * 1000, {}))
+        self.assertEqual(cache.get('entry'), ('x' * 1000, {}))
+
+    def test_urlwrappers_are_picklable(self):
+        cache = ReaderCache(self.cache_path)
+        settings = {'TAG_URL': 'tag/{slug}.html', 'FILTER': lambda x: x}
+        cache.set('key', ('', {'tags': [Tag('foo', settings)]}))
+        tag = cache.get('key')[1]['tags'][0]
+        self.assertEqual(tag.name, 'foo')
+        self.assertEqual(tag.slug, 'foo')
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.graph_path = os.path.join(self.temp_path, 'deps.json')
+        self.settings = get_settings()
+        self.sources = []
+        for i in range(2):
+            source = os.path.join(self.temp_path, 'article%d.rst' % i)
+            with open(source, 'w') as f:
+                f.write('content')
+            self.sources.append(source)
+
+    def tearDown(self):
+        rmtree(self.temp_path)
+
+    def _new_build(self):
+        articles = [Article('content', {'title': 'title %d' % i},
+                            settings=self.settings, filename=source)
+                    for i, source in enumerate(self.sources)]
+        context = {'filenames': dict(zip(self.sources, articles)),
+                   'articles': articles}
+        return DependencyGraph(self.graph_path, self.settings), context
+
+    def _outdated(self, graph, context):
+        env = Environment(loader=DictLoader({'article.html': ''}))
+        template = env.get_template('article.html')
+        outdated = []
+        for article in context['articles']:
+            signature = graph.file_signature(article.save_as, template,
+                    dict(context, article=article), context, '')
+            if graph.update(article.save_as, signature):
+                outdated.append(article.save_as)
+        graph.save()
+        return outdated
+
+    def test_only_changed_outputs_are_outdated(self):
+        graph, context = self._new_build()
+        self.assertEqual(self._outdated(graph, context),
+                         ['title-0.html', 'title-1.html'])
+
+        graph, context = self._new_build()
+        self.assertEqual(self._outdated(graph, context), [])
+
+        t = time.time() + 10
+        os.utime(self.sources[1], (t, t))
+        graph, context = self._new_build()
+        self.assertEqual(self._outdated(graph, context), ['title-1.html'])
+
+    def test_site_changes_outdate_everything(self):
+        graph, context = self._new_build()
+        self._outdated(graph, context)
+
+        self.settings['SITENAME'] = 'Another name'
+        graph, context = self._new_build()
+        self.assertEqual(self._outdated(graph, context),
+                         ['title-0.html', 'title-1.html'])
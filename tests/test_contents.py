@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
+from mock import patch
+
 from .support import unittest
 
-from pelican.contents import Page, Article
+from pelican.contents import (Page, Article, Tag, Category, get_url_wrapper,
+                              intern_url_wrapper, clear_url_wrappers)
 from pelican.settings import _DEFAULT_CONFIG
 from pelican.utils import truncate_html_words
 from pelican.signals import content_object_init
@@ -42,6 +45,23 @@ class TestPage(unittest.TestCase):
             self.assertEqual(value, getattr(page, key))
         self.assertEqual(page.content, TEST_CONTENT)
 
+    def test_metadata(self):
+        """The metadata dict is the one given by the reader, whatever the
+        changes made to the attributes."""
+        metadata = {'title': 'foobar', 'Foo': 'bar',
+                    'date_format': ('C', '%Y')}
+        page = Page(TEST_CONTENT, metadata=metadata)
+        self.assertEqual(page.foo, 'bar')
+        page.title = 'changed'
+        self.assertEqual(page.metadata, metadata)
+        page.metadata['parts'] = ['part']
+        self.assertEqual(page.metadata['parts'], ['part'])
+
+        # plugins can still set attributes which are not in the slots
+        page.thumbnail = 'thumbnail.png'
+        self.assertEqual(page.thumbnail, 'thumbnail.png')
+        self.assertFalse(hasattr(page, 'bar'))
+
     def test_mandatory_properties(self):
         """If the title is not set, must throw an exception."""
         page = Page('content')
@@ -70,6 +90,12 @@ class TestPage(unittest.TestCase):
         page = Page(**page_kwargs)
         self.assertEqual(page.summary, truncate_html_words(TEST_CONTENT, 10))
 
+        # the summary is only computed once
+        with patch('pelican.contents.truncate_html_words') as truncate:
+            self.assertEqual(page.summary, truncate_html_words(TEST_CONTENT,
+                                                               10))
+            self.assertFalse(truncate.called)
+
     def test_slug(self):
         """If a title is given, it should be used to generate the slug."""
         page = Page(**self.page_kwargs)
@@ -165,6 +191,32 @@ class TestPage(unittest.TestCase):
 
         return page_kwargs
 
+    def test_intrasite_links(self):
+        """Intra-site links are resolved, with the local siteurl."""
+        settings = _DEFAULT_CONFIG.copy()
+        settings['PATH'] = 'content'
+        linked = Page('content', metadata={'title': 'linked'},
+                      settings=settings)
+        page_kwargs = self._copy_page_kwargs()
+        page_kwargs['settings'] = settings
+        page_kwargs['filename'] = 'content/article.rst'
+        page_kwargs['context']['filenames'] = {'linked.rst': linked}
+        page_kwargs['content'] = (
+            '<a href="|filename|linked.rst#part">linked</a> '
+            '<img src="|SITEURL|/image.png"> '
+            '<a href="|filename|/missing.rst">missing</a>')
+        page = Page(**page_kwargs)
+
+        self.assertEqual(page.resolve_links(), set(['missing.rst']))
+        self.assertEqual(page.content,
+                         '<a href="/pages/linked.html#part">linked</a> '
+                         '<img src="/image.png"> '
+                         '<a href="|filename|/missing.rst">missing</a>')
+        self.assertEqual(page.get_content('..'),
+                         '<a href="../pages/linked.html#part">linked</a> '
+                         '<img src="../image.png"> '
+                         '<a href="|filename|/missing.rst">missing</a>')
+
     def test_signal(self):
         """If a title is given, it should be used to generate the slug."""
 
@@ -187,3 +239,35 @@ class TestArticle(TestPage):
         article_kwargs['metadata']['template'] = 'custom'
         custom_article = Article(**article_kwargs)
         self.assertEqual('custom', custom_article.template)
+
+
+class TestURLWrapper(unittest.TestCase):
+
+    def tearDown(self):
+        clear_url_wrappers()
+
+    def test_url_wrappers_are_shared(self):
+        settings = _DEFAULT_CONFIG.copy()
+        tag = get_url_wrapper(Tag, 'foo', settings)
+        self.assertIs(get_url_wrapper(Tag, ' foo', settings), tag)
+        self.assertIsNot(get_url_wrapper(Category, 'foo', settings), tag)
+        self.assertIsNot(get_url_wrapper(Tag, 'foo', settings.copy()), tag)
+
+        # the wrappers sent back by the reading processes are replaced
+        self.assertIs(intern_url_wrapper(Tag('foo', settings)), tag)
+
+        clear_url_wrappers(settings)
+        self.assertIsNot(get_url_wrapper(Tag, 'foo', settings), tag)
+
+    def test_url_wrappers_of_other_settings(self):
+        settings = _DEFAULT_CONFIG.copy()
+        tag = get_url_wrapper(Tag, 'foo', settings)
+        other = settings.copy()
+        self.assertIsNot(get_url_wrapper(Tag, 'foo', other), tag)
+        clear_url_wrappers(other)
+        self.assertIs(get_url_wrapper(Tag, 'foo', settings), tag)
+
+        # only the wrappers of the last settings objects are kept
+        for i in range(10):
+            get_url_wrapper(Tag, 'foo', settings.copy())
+        self.assertIsNot(get_url_wrapper(Tag, 'foo', settings), tag)
@@ -9,7 +9,7 @@ from tempfile import mkdtemp
 from shutil import rmtree
 
 from pelican.generators import ArticlesGenerator, PagesGenerator, \
-    TemplatePagesGenerator
+    TemplatePagesGenerator, StaticGenerator, create_environment
 from pelican.writers import Writer
 from pelican.settings import _DEFAULT_CONFIG
 from .support import unittest, get_settings
@@ -147,6 +147,58 @@ class TestArticlesGenerator(unittest.TestCase):
         generator.generate_direct_templates(write)
         write.assert_called_count == 0
 
+    def test_filter_dates(self):
+        settings = get_settings()
+        settings['DEFAULT_DATE'] = (1970, 1, 1)
+        settings['filenames'] = {}
+        generator = ArticlesGenerator(settings.copy(), settings, CUR_DIR,
+                                      settings['THEME'], None,
+                                      settings['MARKUP'], None)
+        generator.generate_context()
+        dates = generator.dates
+        self.assertEqual(generator.filter_dates(generator.articles), dates)
+        # translations and duplicates are left out, the order of the dates
+        # is kept
+        articles = [dates[2], dates[0], dates[2]] + generator.translations
+        self.assertEqual(generator.filter_dates(articles),
+                         [dates[0], dates[2]])
+
+    def test_period_archives(self):
+        settings = get_settings()
+        settings['DEFAULT_DATE'] = (1970, 1, 1)
+        settings['filenames'] = {}
+        settings['MONTH_ARCHIVE_SAVE_AS'] = 'posts/{year}/{month:02d}/'\
+                                            'index.html'
+        generator = ArticlesGenerator(settings.copy(), settings, CUR_DIR,
+                                      settings['THEME'], None,
+                                      settings['MARKUP'], None)
+        generator.generate_context()
+
+        # the periods hold the articles in the order of the archives
+        years, months = generator.years, generator.months
+        self.assertEqual(generator.context['years'], years)
+        self.assertEqual(sum([year.articles for year in years], []),
+                         generator.dates)
+        self.assertEqual(sum([month.articles for month in months], []),
+                         generator.dates)
+        self.assertEqual(sum([year.months for year in years], []), months)
+        for month in months:
+            self.assertEqual(set((a.date.year, a.date.month)
+                                 for a in month.articles),
+                             set([(month.year, month.month)]))
+        self.assertEqual(years[0].count,
+                         sum(month.count for month in years[0].months))
+
+        # only the archives of the months are generated
+        write = MagicMock()
+        generator.generate_period_archives(write)
+        self.assertEqual(write.call_count, len(months))
+        args, kwargs = write.call_args_list[0]
+        self.assertEqual(args[0], 'posts/%d/%02d/index.html' % (
+            months[0].year, months[0].month))
+        self.assertEqual(kwargs['period'], months[0])
+        self.assertEqual(kwargs['dates'], months[0].articles)
+
     def test_per_article_template(self):
         """
         Custom template articles get the field but standard/unset are None
@@ -246,3 +298,112 @@ class TestTemplatePagesGenerator(unittest.TestCase):
         # output content is correct
         with open(output_filename, 'r') as output_file:
             self.assertEquals(output_file.read(), 'foo: bar')
+
+    def test_source_named_like_a_theme_template(self):
+        settings = get_settings()
+        settings['TEMPLATE_PAGES'] = {'archives.html': 'archives.html'}
+        env = create_environment(settings, settings['THEME'])
+        loaders = list(env.loader.loaders)
+        theme_template = env.get_template('archives.html')
+
+        with open(os.path.join(self.temp_content, 'archives.html'),
+                  'w') as template_file:
+            template_file.write(self.TEMPLATE_CONTENT)
+        writer = Writer(self.temp_output, settings=settings)
+        generator = TemplatePagesGenerator({'foo': 'bar'}, settings,
+                self.temp_content, settings['THEME'], self.temp_output, None,
+                writer, env=env)
+        generator.generate_output(writer)
+
+        with open(os.path.join(self.temp_output, 'archives.html')) as f:
+            self.assertEqual(f.read(), 'foo: bar')
+        # the shared environment is not modified
+        self.assertEqual(env.loader.loaders, loaders)
+        self.assertIs(env.get_template('archives.html'), theme_template)
+
+
+class TestStaticGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        self.content_path = os.path.join(self.temp_path, 'content')
+        self.output_path = os.path.join(self.temp_path, 'output')
+        os.makedirs(os.path.join(self.content_path, 'images'))
+
+    def tearDown(self):
+        rmtree(self.temp_path)
+
+    def generate(self, incremental=True):
+        settings = get_settings()
+        settings['INCREMENTAL_BUILD'] = incremental
+        settings['PATH'] = self.content_path
+        settings['OUTPUT_PATH'] = self.output_path
+        settings['CACHE_PATH'] = os.path.join(self.temp_path, 'cache')
+        settings['STATIC_PATHS'] = ['images']
+        context = settings.copy()
+        context['filenames'] = {}
+        generator = StaticGenerator(context, settings, self.content_path,
+                settings['THEME'], self.output_path, None, None)
+        generator.generate_context()
+        generator.generate_output(None)
+
+    def test_remove_synchronized_files(self):
+        for name in ('a.png', 'b.png'):
+            open(os.path.join(self.content_path, 'images', name), 'w').close()
+        self.generate()
+        images = os.path.join(self.output_path, 'static', 'images')
+        self.assertEqual(sorted(os.listdir(images)), ['a.png', 'b.png'])
+        self.assertTrue(os.path.exists(os.path.join(self.output_path,
+                                                    'theme', 'css')))
+
+        # files written by plugins next to the synchronized ones are kept
+        os.makedirs(os.path.join(self.output_path, 'theme', 'gen'))
+        for path in (('theme', 'gen', 'packed.css'),
+                     ('static', 'images', 'thumbnail.png')):
+            open(os.path.join(self.output_path, *path), 'w').close()
+        os.remove(os.path.join(self.content_path, 'images', 'a.png'))
+        self.generate()
+        self.assertEqual(sorted(os.listdir(images)),
+                         ['b.png', 'thumbnail.png'])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.output_path, 'theme', 'gen', 'packed.css')))
+
+    def test_no_manifest_without_incremental_build(self):
+        open(os.path.join(self.content_path, 'images', 'a.png'), 'w').close()
+        self.generate(incremental=False)
+        os.remove(os.path.join(self.content_path, 'images', 'a.png'))
+        self.generate(incremental=False)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_path,
+                                                     'cache')))
+        self.assertTrue(os.path.exists(os.path.join(
+            self.output_path, 'static', 'images', 'a.png')))
+
+
+class TestEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_cache = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.temp_cache)
+
+    def test_environment_is_shared(self):
+        settings = get_settings()
+        env = create_environment(settings, settings['THEME'])
+        generators = [cls(settings.copy(), settings, CUR_DIR,
+                          settings['THEME'], None, settings['MARKUP'], None,
+                          env=env)
+                      for cls in (ArticlesGenerator, PagesGenerator)]
+        for generator in generators:
+            self.assertIs(generator.env, env)
+        self.assertIs(generators[0].get_template('article'),
+                      generators[1].get_template('article'))
+
+    def test_templates_cache(self):
+        settings = get_settings()
+        settings['CACHE_TEMPLATES'] = True
+        settings['CACHE_PATH'] = self.temp_cache
+        env = create_environment(settings, settings['THEME'])
+        env.get_template('article.html')
+        self.assertNotEqual(os.listdir(os.path.join(self.temp_cache,
+                                                    'templates')), [])
@@ -12,7 +12,9 @@ from shutil import rmtree
 import locale
 import logging
 
-from pelican import Pelican
+from pelican import Pelican, signals
+from pelican.plugins import sitemap
+from pelican.profiler import Profiler
 from pelican.settings import read_settings
 from .support import LogCountHandler
 
@@ -47,11 +49,13 @@ class TestPelican(unittest.TestCase):
         self.logcount_handler = LogCountHandler()
         logging.getLogger().addHandler(self.logcount_handler)
         self.temp_path = mkdtemp()
+        self.temp_cache = mkdtemp()
         self.old_locale = locale.setlocale(locale.LC_ALL)
         locale.setlocale(locale.LC_ALL, str('C'))
 
     def tearDown(self):
         rmtree(self.temp_path)
+        rmtree(self.temp_cache)
         locale.setlocale(locale.LC_ALL, self.old_locale)
         logging.getLogger().removeHandler(self.logcount_handler)
 
@@ -73,6 +77,7 @@ class TestPelican(unittest.TestCase):
         settings = read_settings(filename=None, override={
             'PATH': INPUT_PATH,
             'OUTPUT_PATH': self.temp_path,
+            'CACHE_PATH': self.temp_cache,
             'LOCALE': locale.normalize('en_US'),
             })
         pelican = Pelican(settings=settings)
@@ -82,16 +87,130 @@ class TestPelican(unittest.TestCase):
         self.assertEqual(self.logcount_handler.count_logs(
             msg="Unable to find.*skipping url replacement",
             level=logging.WARNING,
-            ), 10, msg="bad number of occurences found for this log")
+            ), 1, msg="bad number of occurences found for this log")
 
     def test_custom_generation_works(self):
         # the same thing with a specified set of settings should work
         settings = read_settings(filename=SAMPLE_CONFIG, override={
             'PATH': INPUT_PATH,
             'OUTPUT_PATH': self.temp_path,
+            'CACHE_PATH': self.temp_cache,
             'LOCALE': locale.normalize('en_US'),
             })
         pelican = Pelican(settings=settings)
         pelican.run()
         dcmp = dircmp(self.temp_path, os.sep.join((OUTPUT_PATH, "custom")))
         self.assertFilesEqual(recursiveDiff(dcmp))
+
+    def test_plugin_generators(self):
+        # the generators of plugins only get the positional arguments
+        generated = []
+
+        class PluginGenerator(object):
+            def __init__(self, context, settings, path, theme, output_path,
+                         *null):
+                self.context = context
+
+            def generate_output(self, writer):
+                generated.append(len(self.context['articles']))
+
+        def get_generators(pelican):
+            return PluginGenerator
+
+        settings = read_settings(filename=None, override={
+            'PATH': INPUT_PATH,
+            'OUTPUT_PATH': self.temp_path,
+            'CACHE_PATH': self.temp_cache,
+            'TAGS_SAVE_AS': 'tags.html',
+            'CATEGORIES_SAVE_AS': 'categories.html',
+            'ARCHIVES_SAVE_AS': 'archives.html',
+            'INDEX_SAVE_AS': 'index.html',
+            })
+        signals.get_generators.connect(get_generators)
+        try:
+            Pelican(settings=settings).run()
+        finally:
+            signals.get_generators.disconnect(get_generators)
+        self.assertEqual(len(generated), 1)
+        self.assertTrue(generated[0] > 0)
+
+    def test_only_static_changed(self):
+        settings = read_settings(filename=None, override={
+            'PATH': INPUT_PATH,
+            'OUTPUT_PATH': self.temp_path,
+            'CACHE_PATH': self.temp_cache,
+            'STATIC_PATHS': ['pictures'],
+            })
+        pelican = Pelican(settings=settings)
+        self.assertTrue(pelican.only_static_changed(
+            [os.path.join(INPUT_PATH, 'pictures', 'Fat_Cat.jpg')]))
+        self.assertFalse(pelican.only_static_changed(
+            [os.path.join(INPUT_PATH, 'pictures', 'Fat_Cat.jpg'),
+             os.path.join(INPUT_PATH, 'article.rst')]))
+        self.assertFalse(pelican.only_static_changed(
+            [os.path.join(settings['THEME'], 'templates', 'index.html')]))
+
+        pelican.run(changed_paths=[
+            os.path.join(INPUT_PATH, 'pictures', 'Fat_Cat.jpg')])
+        self.assertTrue(os.path.exists(os.path.join(self.temp_path, 'static',
+                                                    'pictures',
+                                                    'Fat_Cat.jpg')))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_path,
+                                                     'index.html')))
+
+    def test_only_static_changed_with_plugins(self):
+        # the generators of plugins may need the content, e.g. the sitemap,
+        # so the whole site is generated
+        settings = read_settings(filename=None, override={
+            'PATH': INPUT_PATH,
+            'OUTPUT_PATH': self.temp_path,
+            'CACHE_PATH': self.temp_cache,
+            'STATIC_PATHS': ['pictures'],
+            'TAGS_SAVE_AS': 'tags.html',
+            'CATEGORIES_SAVE_AS': 'categories.html',
+            'ARCHIVES_SAVE_AS': 'archives.html',
+            'INDEX_SAVE_AS': 'index.html',
+            'DEFAULT_PAGINATION': 2,  # the sitemap needs it
+            })
+        pelican = Pelican(settings=settings)
+        signals.get_generators.connect(sitemap.get_generators)
+        try:
+            pelican.run(changed_paths=[
+                os.path.join(INPUT_PATH, 'pictures', 'Fat_Cat.jpg')])
+        finally:
+            signals.get_generators.disconnect(sitemap.get_generators)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_path,
+                                                    'sitemap.xml')))
+        self.assertTrue(os.path.exists(os.path.join(self.temp_path,
+                                                    'index.html')))
+
+    def test_profiler(self):
+        settings = read_settings(filename=None, override={
+            'PATH': INPUT_PATH,
+            'OUTPUT_PATH': self.temp_path,
+            'CACHE_PATH': self.temp_cache,
+            'READ_WORKERS': 2,
+            'WRITE_WORKERS': 2,
+            'TAGS_SAVE_AS': 'tags.html',
+            'CATEGORIES_SAVE_AS': 'categories.html',
+            'ARCHIVES_SAVE_AS': 'archives.html',
+            'INDEX_SAVE_AS': 'index.html',
+            })
+        pelican = Pelican(settings=settings)
+        profiler = Profiler(top=3)
+        profiler.start()
+        try:
+            pelican.run()
+        finally:
+            profiler.stop()
+
+        phases = [name for category, name, _, _ in profiler.timings
+                  if category == 'phase']
+        self.assertIn('ArticlesGenerator.generate_context', phases)
+        self.assertIn('flush', phases)
+        # the timings measured by the worker processes are kept
+        totals = profiler.totals()
+        self.assertGreater(totals['read'][0], 0)
+        self.assertGreater(totals['render'][0], 0)
+        self.assertGreater(totals['feed'][0], 0)
+        self.assertIn('slowest ones', profiler.report())
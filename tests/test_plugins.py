@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 '''Core plugins unit tests'''
 
+import gzip
 import os
 import tempfile
 
+from mock import Mock, patch
+
 from pelican.plugins import gzip_cache
 
 from .support import unittest, temporary_folder
@@ -34,3 +37,57 @@ class TestGzipCache(unittest.TestCase):
             gzip_cache.create_gzip_file(a_html_filename)
             self.assertTrue(os.path.exists(a_html_filename + '.gz'))
 
+
+    def test_create_gzip_cache(self):
+        '''Test that only the outdated files are compressed, and that the
+        orphaned cache files are removed.'''
+        with temporary_folder() as tempdir:
+            output_path = os.path.join(tempdir, 'output')
+            os.mkdir(output_path)
+            pelican = Mock()
+            pelican.settings = {'OUTPUT_PATH': output_path,
+                                'CACHE_PATH': os.path.join(tempdir, 'cache'),
+                                'INCREMENTAL_BUILD': True,
+                                'GZIP_CACHE_MIN_SIZE': 10}
+            for name, content in (('index.html', 'index' * 10),
+                                  ('small.css', 'small'),
+                                  ('old.html', 'old' * 10)):
+                with open(os.path.join(output_path, name), 'w') as f:
+                    f.write(content)
+            gzip_cache.create_gzip_cache(pelican)
+            self.assertEqual(sorted(os.listdir(output_path)),
+                             ['index.html', 'index.html.gz', 'old.html',
+                              'old.html.gz', 'small.css'])
+
+            os.remove(os.path.join(output_path, 'old.html'))
+            with patch.object(gzip_cache, 'create_gzip_file') as create:
+                gzip_cache.create_gzip_cache(pelican)
+                self.assertFalse(create.called)
+            self.assertEqual(sorted(os.listdir(output_path)),
+                             ['index.html', 'index.html.gz', 'small.css'])
+
+    def test_replaced_by_an_older_file(self):
+        '''Test that a file replaced by a different one with an older
+        modification time, e.g. a static file copied with the time of its
+        source, is compressed again.'''
+        with temporary_folder() as tempdir:
+            pelican = Mock()
+            pelican.settings = {'OUTPUT_PATH': tempdir,
+                                'CACHE_PATH': os.path.join(tempdir, 'cache')}
+            filepath = os.path.join(tempdir, 'main.css')
+            with open(filepath, 'w') as f:
+                f.write('body { color: red; }')
+            gzip_cache.create_gzip_cache(pelican)
+
+            with open(filepath, 'w') as f:
+                f.write('body { color: blue; }')
+            os.utime(filepath, (1000000000, 1000000000))
+            gzip_cache.create_gzip_cache(pelican)
+            compressed = gzip.open(filepath + '.gz', 'rb')
+            try:
+                self.assertEqual(compressed.read(), b'body { color: blue; }')
+            finally:
+                compressed.close()
+            self.assertTrue(gzip_cache.is_up_to_date(filepath))
+            # the orphans are only tracked with incremental builds
+            self.assertFalse(os.path.exists(os.path.join(tempdir, 'cache')))
@@ -4,6 +4,8 @@ from __future__ import unicode_literals, print_function
 import datetime
 import os
 
+from mock import patch
+
 from pelican import readers
 from .support import unittest
 
@@ -111,6 +113,16 @@ class RstReaderTest(unittest.TestCase):
         except ImportError:
             return unittest.skip('need the typogrify distribution')
 
+    def test_publisher_settings_are_shared(self):
+        filenames = [_filename('article.rst'),
+                     _filename('article_with_metadata.rst')]
+        expected = [readers.RstReader({}).read(f) for f in filenames]
+        with patch.object(readers.docutils.core.Publisher,
+                          'process_programmatic_settings') as process:
+            for f, (content, metadata) in zip(filenames, expected):
+                self.assertEqual(readers.RstReader({}).read(f)[0], content)
+            self.assertFalse(process.called)
+
 
 class MdReaderTest(unittest.TestCase):
 
@@ -204,6 +216,21 @@ class MdReaderTest(unittest.TestCase):
         for key, value in expected.items():
             self.assertEquals(value, metadata[key], key)
 
+    @unittest.skipUnless(readers.Markdown, "markdown isn't installed")
+    def test_markdown_instance_is_reused(self):
+        filename = _filename('article_with_md_extension.md')
+        content, metadata = readers.MarkdownReader({}).read(filename)
+
+        readers.MarkdownReader({}).read(
+            _filename('article_with_markdown_and_summary_metadata_multi.md'))
+        with patch.object(readers, 'Markdown') as markdown:
+            new_content, new_metadata = readers.MarkdownReader({}).read(
+                filename)
+            self.assertFalse(markdown.called)
+        # nothing is left from the previous document
+        self.assertEqual(new_content, content)
+        self.assertEqual(sorted(new_metadata), ['category', 'title'])
+
 class AdReaderTest(unittest.TestCase):
 
     @unittest.skipUnless(readers.asciidoc, "asciidoc isn't installed")
@@ -246,3 +273,33 @@ class AdReaderTest(unittest.TestCase):
                    '<p>version 1.0.42</p>\n'\
                    '<p>The quick brown fox jumped over the lazy dog&#8217;s back.</p>\n'
         self.assertEqual(content, expected)
+
+
+class ReadFilesTest(unittest.TestCase):
+
+    def test_parallel_reading(self):
+        # reading in a pool of processes gives the same results, in the same
+        # order, as reading serially
+        filenames = [_filename('article.rst'),
+                     _filename('article_with_metadata.rst'),
+                     _filename('unknown_file.rst'),
+                     _filename('article_with_template.rst')]
+        settings = {'FILTER': lambda x: x}
+        serial = list(readers.read_files(filenames, settings))
+        parallel = list(readers.read_files(filenames, settings, workers=2))
+
+        self.assertEqual([r[0] for r in serial], filenames)
+        self.assertEqual([r[0] for r in parallel], filenames)
+        for (_, content, metadata, error), (_, pcontent, pmetadata,
+                perror) in zip(serial, parallel):
+            self.assertEqual(content, pcontent)
+            self.assertEqual(error is None, perror is None)
+            if metadata is not None:
+                self.assertEqual(sorted(metadata), sorted(pmetadata))
+                self.assertEqual(metadata['title'], pmetadata['title'])
+        self.assertIsNotNone(parallel[2][3])
+
+        tags = parallel[1][2]['tags']
+        self.assertEqual(tags, ['foo', 'bar', 'foobar'])
+        for tag in tags:
+            self.assertIs(tag.settings, settings)
@@ -4,12 +4,45 @@ import shutil
 import os
 import datetime
 import time
+import locale
+import random
+import re
+import unicodedata
+from tempfile import mkdtemp
+
+import six
+from jinja2 import Markup
+from unidecode import unidecode
 
 from pelican import utils
 from .support import get_article, unittest
 from pelican.utils import NoFilesError
 
 
+def reference_slugify(value):
+    """The slugify implementation without the fast path and the cache."""
+    value = Markup(value).striptags()
+    value = unidecode(value)
+    if isinstance(value, six.binary_type):
+        value = value.decode('ascii')
+    value = unicodedata.normalize('NFKD', value)
+    value = re.sub(r'[^\w\s-]', '', value).strip().lower()
+    value = re.sub(r'[-\s]+', '-', value)
+    return value.encode('ascii', 'ignore').decode('ascii')
+
+
+def reference_get_date(string):
+    """The get_date implementation without the fast path and the learning of
+    the formats."""
+    string = re.sub(' +', ' ', string)
+    for date_format in utils._DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(string, date_format)
+        except ValueError:
+            pass
+    raise ValueError("'%s' is not a valid date" % string)
+
+
 class TestUtils(unittest.TestCase):
 
     def test_get_date(self):
@@ -38,6 +71,60 @@ class TestUtils(unittest.TestCase):
         for item in invalid_dates:
             self.assertRaises(ValueError, utils.get_date, item)
 
+    def test_get_date_formats_order(self):
+        # %Y-%d-%m is only used when %Y-%m-%d does not match
+        self.assertEqual(utils.get_date('2012-22-11'),
+                         datetime.datetime(2012, 11, 22))
+        self.assertEqual(utils.get_date('2012-10-11'),
+                         datetime.datetime(2012, 10, 11))
+        self.assertEqual(utils.get_date('2012-1-5'),
+                         datetime.datetime(2012, 1, 5))
+
+        # the dates in all the formats, valid or not, parsed in a random
+        # order whatever the format of the previous one
+        _random = random.Random(0)
+        values = []
+        for date_format in utils._DATE_FORMATS:
+            for _ in range(50):
+                date = datetime.datetime(2012, 1, 1) + datetime.timedelta(
+                    minutes=_random.randint(0, 2000000))
+                value = date.strftime(date_format)
+                values += [value, value.replace('0', '', 1), value + ' ',
+                           value.replace('1', '3'), value.replace(' ', '  ')]
+        values += ['2012-02-30', '2012-11-22 24:00', '2012-11-22 22:11:60',
+                   '2012-11-22T22:11', '2012-11-22\n', '0000-01-01']
+        _random.shuffle(values)
+        for value in values:
+            try:
+                expected = reference_get_date(value)
+            except ValueError:
+                self.assertRaises(ValueError, utils.get_date, value)
+            else:
+                self.assertEqual(utils.get_date(value), expected, value)
+
+    def test_date_formatter(self):
+        date = datetime.datetime(2012, 11, 22, 15, 30)
+        date_formats = ('%a %A %d %b %B %Y %p %% %%a %c %x %X, à %Hh%M',
+                        '%EY %Ec %Od %%E %B')
+        old_locale = locale.setlocale(locale.LC_ALL)
+        tested = []
+        for locale_name in ('C', 'fr_FR.UTF-8', 'ja_JP.utf8'):
+            try:
+                formatter = utils.DateFormatter(locale_name)
+            except locale.Error:
+                continue  # the locale is not available on this system
+            tested.append(locale_name)
+            for date_format in date_formats:
+                locale.setlocale(locale.LC_ALL, str(locale_name))
+                try:
+                    expected = utils.strftime(date, date_format)
+                finally:
+                    locale.setlocale(locale.LC_ALL, old_locale)
+                self.assertEqual(formatter(date, date_format), expected)
+                self.assertEqual(locale.setlocale(locale.LC_ALL), old_locale)
+        if tested == ['C']:
+            self.skipTest('no locale other than C is available')
+
     def test_slugify(self):
 
         samples = (('this is a test', 'this-is-a-test'),
@@ -50,6 +137,39 @@ class TestUtils(unittest.TestCase):
         for value, expected in samples:
             self.assertEquals(utils.slugify(value), expected)
 
+    def test_slugify_non_string(self):
+        # e.g. a numeric title, or a metadata which is not set
+        for value, expected in ((2012, '2012'), (None, 'none'),
+                                (1.5, '15')):
+            self.assertEqual(utils.slugify(value), expected)
+            self.assertEqual(utils.slugify(value), reference_slugify(value))
+
+    def test_slugify_corpus(self):
+        # the characters of the Basic Multilingual Plane (every character of
+        # the alphabets, some of the others) between words, then random
+        # strings mixing ASCII, markup, entities, whitespace and other scripts
+        values = []
+        codes = list(range(0x3000)) + list(range(0x3000, 0xd800, 17)) + \
+            list(range(0xe000, 0x10000, 17))
+        for code in codes:
+            values.append(' foo%s-Bar ' % six.unichr(code))
+        pieces = ['Foo', 'bar', ' ', '  ', '\t', '\n', '\x1c', '-', '--',
+                  '_', '<b>', '</b>', '<!-- c -->', '&amp;', '&lt;', '&#233;',
+                  '&', '<', '>', '\u00a0', '\u3000', 'élève', 'Œuvre',
+                  '測試', '号機', 'Привет', 'ﬁ', '²', 'Ⅻ', '\u0301', '→']
+        _random = random.Random(0)
+        for _ in range(5000):
+            values.append(''.join(_random.choice(pieces)
+                                  for _ in range(_random.randint(1, 8))))
+
+        for value in values:
+            self.assertEqual(utils.slugify(value), reference_slugify(value),
+                             repr(value))
+        # once more, from the cache
+        for value in values[-1000:]:
+            self.assertEqual(utils.slugify(value), reference_slugify(value),
+                             repr(value))
+
     def test_get_relative_path(self):
 
         samples = (('test/test.html', '..'),
@@ -59,6 +179,21 @@ class TestUtils(unittest.TestCase):
         for value, expected in samples:
             self.assertEquals(utils.get_relative_path(value), expected)
 
+    def test_truncate_html_words(self):
+        html = '<p>one <b>two <i>three</i></b><br> four</p>\n<p>five</p>'
+        self.assertEqual(utils.truncate_html_words(html, 0), '')
+        self.assertEqual(utils.truncate_html_words(html, 2),
+                         '<p>one <b>two ...</b></p>')
+        self.assertEqual(utils.truncate_html_words(html, 3),
+                         '<p>one <b>two <i>three ...</i></b></p>')
+        self.assertEqual(utils.truncate_html_words(html, 4, end_text=''),
+                         '<p>one <b>two <i>three</i></b><br> four</p>')
+        self.assertEqual(utils.truncate_html_words(html, 5), html)
+        # an end tag closes the unclosed tags opened after its start tag
+        self.assertEqual(utils.truncate_html_words(
+                         '<div><p>one <b>two</div> three &amp; four', 3),
+                         '<div><p>one <b>two</div> three ...')
+
     def test_process_translations(self):
         # create a bunch of articles
         fr_article1 = get_article(lang='fr', slug='yay', title='Un titre',
@@ -126,3 +261,89 @@ class TestUtils(unittest.TestCase):
         f.close()
         utils.clean_output_dir(test_directory)
         self.assertTrue(not os.path.exists(test_directory))
+
+    def test_layered_context(self):
+        shared = {'SITENAME': 'site', 'articles': [1, 2]}
+        context = utils.LayeredContext({'articles': [1]}, shared)
+        self.assertEqual(context['articles'], [1])
+        self.assertEqual(context['SITENAME'], 'site')
+        self.assertNotIn('page_name', context)
+        self.assertEqual(sorted(context), ['SITENAME', 'articles'])
+
+        child = context.new_child({'page_name': 'index'})
+        self.assertEqual(len(child.maps), 3)
+        self.assertEqual(child.flatten(), {'SITENAME': 'site',
+                                           'articles': [1],
+                                           'page_name': 'index'})
+        self.assertNotIn('page_name', context)
+        # the shared context is never modified
+        self.assertEqual(shared, {'SITENAME': 'site', 'articles': [1, 2]})
+
+    def test_list_tree(self):
+        temp_path = mkdtemp()
+        source = os.path.join(temp_path, 'source')
+        destination = os.path.join(temp_path, 'destination')
+        os.makedirs(os.path.join(source, 'css'))
+        for name in ('main.css', 'css/pygment.css'):
+            with open(os.path.join(source, name), 'w') as f:
+                f.write(name)
+        try:
+            self.assertEqual(utils.list_tree(source, destination), {
+                os.path.join(destination, 'main.css'):
+                    os.path.join(source, 'main.css'),
+                os.path.join(destination, 'css', 'pygment.css'):
+                    os.path.join(source, 'css', 'pygment.css')})
+        finally:
+            shutil.rmtree(temp_path)
+
+    def test_sync_tree(self):
+        temp_path = mkdtemp()
+        source = os.path.join(temp_path, 'source')
+        destination = os.path.join(temp_path, 'destination')
+        os.makedirs(os.path.join(source, 'css'))
+        for name in ('main.css', 'css/pygment.css'):
+            with open(os.path.join(source, name), 'w') as f:
+                f.write(name)
+        try:
+            self.assertEqual(utils.sync_tree(source, destination), (2, 0))
+            # unchanged files are not copied again
+            self.assertEqual(utils.sync_tree(source, destination), (0, 0))
+
+            with open(os.path.join(source, 'main.css'), 'w') as f:
+                f.write('changed')
+            t = time.time() + 10
+            os.utime(os.path.join(source, 'main.css'), (t, t))
+            open(os.path.join(destination, 'old.css'), 'w').close()
+            os.remove(os.path.join(source, 'css', 'pygment.css'))
+            self.assertEqual(utils.sync_tree(source, destination), (1, 2))
+            self.assertEqual(os.listdir(destination), ['main.css'])
+        finally:
+            shutil.rmtree(temp_path)
+
+    def test_remove_stale_files(self):
+        temp_path = mkdtemp()
+        os.makedirs(os.path.join(temp_path, 'css', 'old'))
+        for name in ('main.css', 'plugin.css', 'css/old/old.css'):
+            open(os.path.join(temp_path, name), 'w').close()
+        try:
+            stale = [os.path.join(temp_path, name)
+                     for name in ('main.css', 'css/old/old.css', 'gone.css')]
+            self.assertEqual(utils.remove_stale_files(stale, temp_path),
+                             sorted(stale[:2]))
+            # only the listed files are removed, then the empty directories
+            self.assertEqual(os.listdir(temp_path), ['plugin.css'])
+        finally:
+            shutil.rmtree(temp_path)
+
+    def test_copy_file_hardlink(self):
+        temp_path = mkdtemp()
+        source = os.path.join(temp_path, 'source.png')
+        destination = os.path.join(temp_path, 'output', 'image.png')
+        with open(source, 'w') as f:
+            f.write('image')
+        try:
+            self.assertTrue(utils.copy_file(source, destination, 'hardlink'))
+            self.assertTrue(os.path.samefile(source, destination))
+            self.assertFalse(utils.copy_file(source, destination))
+        finally:
+            shutil.rmtree(temp_path)
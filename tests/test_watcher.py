@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import os
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from pelican import watcher
+from pelican.watcher import Watcher, PollingBackend, InotifyBackend
+from .support import unittest
+
+
+class WatcherTestMixin(object):
+
+    backend = None
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        os.mkdir(os.path.join(self.temp_path, 'output'))
+        self.watcher = Watcher([self.temp_path], debounce=.1,
+                               ignore=[os.path.join(self.temp_path, 'output')],
+                               backend=self.backend)
+
+    def tearDown(self):
+        self.watcher.close()
+        rmtree(self.temp_path)
+
+    def _write(self, *path):
+        filename = os.path.join(self.temp_path, *path)
+        with open(filename, 'w') as f:
+            f.write(filename)
+        return filename
+
+    def test_changes_are_reported(self):
+        self.assertEqual(self.watcher.wait(timeout=.1), set())
+        os.mkdir(os.path.join(self.temp_path, 'dir'))
+        changed = set([self._write('a.rst'), self._write('dir', 'b.png')])
+        self.assertEqual(self.watcher.wait(timeout=2), changed)
+
+        os.remove(os.path.join(self.temp_path, 'a.rst'))
+        self.assertEqual(self.watcher.wait(timeout=2),
+                         set([os.path.join(self.temp_path, 'a.rst')]))
+
+    def test_ignored_files(self):
+        self._write('.a.rst.swp')
+        self._write('output', 'index.html')
+        self.assertEqual(self.watcher.wait(timeout=.6), set())
+
+
+class TestPollingWatcher(WatcherTestMixin, unittest.TestCase):
+
+    backend = PollingBackend
+
+
+@unittest.skipUnless(watcher.pyinotify, 'needs pyinotify')
+class TestInotifyWatcher(WatcherTestMixin, unittest.TestCase):
+
+    backend = InotifyBackend
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+
+import os
+import datetime
+from codecs import open
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from jinja2 import Environment, DictLoader
+
+from mock import patch
+
+from pelican.contents import Article
+from pelican.writers import Writer
+from .support import unittest, get_settings
+
+
+class TestWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_output = mkdtemp()
+        self.env = Environment(loader=DictLoader({
+            'page.html': '{{ output_file }}: {{ title }} ({{ SITEURL }})'}))
+
+    def tearDown(self):
+        rmtree(self.temp_output)
+
+    def _read(self, name):
+        with open(os.path.join(self.temp_output, name), encoding='utf-8') as f:
+            return f.read()
+
+    def _write_pages(self, writer):
+        template = self.env.get_template('page.html')
+        context = {'localsiteurl': ''}
+        for i in range(10):
+            context['localsiteurl'] = '..'
+            writer.write_file(template, {'title': 'title %d' % i,
+                                         'SITEURL': '..'},
+                              self.temp_output, 'dir/page%d.html' % i,
+                              context=context)
+
+    def test_deferred_rendering(self):
+        writer = Writer(self.temp_output, settings={})
+        writer.defer()
+        self._write_pages(writer)
+        self.assertEqual(os.listdir(self.temp_output), [])
+
+        writer.flush(workers=3)
+        for i in range(10):
+            self.assertEqual(self._read('dir/page%d.html' % i),
+                             'dir/page%d.html: title %d (..)' % (i, i))
+
+        # once flushed, files are written right away again
+        self._write_pages(writer)
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_output,
+                                                     'dir'))), 10)
+
+    def test_unchanged_files_are_not_written(self):
+        writer = Writer(self.temp_output, settings={})
+        self._write_pages(writer)
+        self.assertEqual((writer.written, writer.unchanged), (10, 0))
+
+        path = os.path.join(self.temp_output, 'dir', 'page0.html')
+        os.utime(path, (0, 0))
+        self._write_pages(writer)
+        self.assertEqual((writer.written, writer.unchanged), (10, 10))
+        self.assertEqual(os.path.getmtime(path), 0)
+
+        self.env.loader.mapping['page.html'] = '{{ title }}'
+        self._write_pages(writer)
+        self.assertEqual((writer.written, writer.unchanged), (20, 10))
+        self.assertEqual(self._read('dir/page0.html'), 'title 0')
+        self.assertNotEqual(os.path.getmtime(path), 0)
+
+        # the same goes for the files written by the workers
+        writer.defer()
+        self._write_pages(writer)
+        writer.flush(workers=3)
+        self.assertEqual((writer.written, writer.unchanged), (20, 20))
+
+    def test_streamed_output(self):
+        writer = Writer(self.temp_output, settings={'STREAM_OUTPUT': True})
+        self._write_pages(writer)
+        self.assertEqual((writer.written, writer.unchanged), (10, 0))
+        self.assertEqual(self._read('dir/page0.html'),
+                         'dir/page0.html: title 0 (..)')
+
+        path = os.path.join(self.temp_output, 'dir', 'page0.html')
+        os.utime(path, (0, 0))
+        self._write_pages(writer)
+        self.assertEqual((writer.written, writer.unchanged), (10, 10))
+        self.assertEqual(os.path.getmtime(path), 0)
+
+        # a shorter and a longer output replace the previous one
+        for source in ('{{ title }}', '{{ title }} {{ output_file }}'):
+            self.env.loader.mapping['page.html'] = source
+            self._write_pages(writer)
+            self.assertEqual(self._read('dir/page0.html'),
+                             self.env.get_template('page.html').render(
+                                 title='title 0',
+                                 output_file='dir/page0.html'))
+        self.assertEqual((writer.written, writer.unchanged), (30, 10))
+
+        # no temporary file is left behind, even when the rendering fails
+        self.env.loader.mapping['page.html'] = '{{ title }}{{ 1 / 0 }}'
+        self.assertRaises(ZeroDivisionError, self._write_pages, writer)
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_output,
+                                                     'dir'))), 10)
+
+    def test_feed_entries_are_computed_once(self):
+        settings = get_settings()
+        settings['TIMEZONE'] = 'Europe/Paris'
+        writer = Writer(self.temp_output, settings=settings)
+        context = {'SITEURL': 'http://example.com', 'SITENAME': 'Example',
+                   'FEED_DOMAIN': 'http://example.com', 'localsiteurl': '',
+                   'filenames': {}}
+        articles = [Article('content %d' % i,
+                            {'title': 'title %d' % i,
+                             'date': datetime.datetime(2012, 12, i + 1)},
+                            settings=settings, context=context)
+                    for i in range(3)]
+
+        feed = writer.write_feed(articles, context, 'all.atom.xml')
+        with patch.object(Article, 'get_content') as get_content:
+            tag_feed = writer.write_feed(articles[:2], context,
+                                         'tag.rss.xml', feed_type='rss')
+            self.assertFalse(get_content.called)
+        self.assertEqual(tag_feed.items, feed.items[:2])
+        self.assertEqual(feed.items[0]['description'], 'content 0')
+        self.assertEqual(feed.items[0]['pubdate'].tzinfo.zone, 'Europe/Paris')